@@ -3,119 +3,1012 @@
 # Copyright 2010-2012 Sebastian Werner
 #
 
-import shelve, time, logging, os, os.path, sys, pickle, dbm
+import time, logging, os, os.path, sys, pickle, dbm, sqlite3, collections, glob, threading, queue, zlib, lzma
 
-class Cache:
-    """ 
-    A cache class based on shelve feature of Python. Supports transient in-memory 
-    storage, too. Uses memory storage for caching requests to DB as well for 
-    improved performance. Uses keys for identification of entries like a normal
-    hash table / dictionary.
+from urllib.request import pathname2url
+
+__all__ = ["Cache", "MemoryStore", "MemoryStorage", "OverlayStorage", "DbmStorage", "SqliteStorage", "getFamily", "mergeStatistics", "formatStatistics", "compressData", "decompressData"]
+
+
+# Key families which hold heavy values (parsed trees) and use a separate in-memory budget
+heavyFamilies = ("tree",)
+
+# Default limits (entries, bytes) of the in-memory tiers. None disables the particular limit.
+heavyLimits = (None, 512 * 1024 * 1024)
+lightLimits = (None, 256 * 1024 * 1024)
+
+
+# Serialized values of at least this size (in bytes) are compressed
+compressionThreshold = 16 * 1024
+
+# Reading an entry refreshes its timestamp (used by the retention of collectGarbage())
+# when it is older than this number of seconds
+refreshInterval = 24 * 60 * 60
+
+# Supported compression methods: identifier in the header, compress and decompress function
+compressionMethods = {
+    "zlib" : (b"z", lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma" : (b"x", lambda data: lzma.compress(data, preset=1), lzma.decompress)
+}
+
+# Compressed data starts with a zero byte (which no pickle starts with) followed by the method identifier
+compressionMarker = b"\x00"
+compressionHeaders = dict([(identifier, decompress) for identifier, compress, decompress in compressionMethods.values()])
+
+
+def compressData(data, method="zlib"):
+    """ Compresses the given (pickled) data and prefixes it with the header of the method """
+
+    identifier, compress, decompress = compressionMethods[method]
+    return compressionMarker + identifier + compress(data)
+
+
+def decompressData(data):
+    """ Returns the original data of compressed entries. Other data is returned unmodified. """
+
+    if data[:1] != compressionMarker:
+        return data
+
+    return compressionHeaders[data[1:2]](data[2:])
+
+
+def getFamily(key):
+    """ Returns the family of the given cache key e.g. "tree" for "tree[foo/Bar]-None-True" """
+
+    pos = key.find("[")
+    if pos == -1:
+        return key
+
+    return key[:pos]
+
+
+# Counters collected per key family
+statisticsFields = ("transient", "disk", "miss", "bytesRead", "bytesWritten", "decompressTime", "unpickleTime")
+
+
+def mergeStatistics(target, source):
+    """ Adds the per family counters of source to target and returns target """
+
+    for family, counters in source.items():
+        merged = target.setdefault(family, dict.fromkeys(statisticsFields, 0))
+        for name in statisticsFields:
+            merged[name] += counters[name]
+
+    return target
+
+
+def formatStatistics(statistics):
+    """ Returns a human readable table of the given per family statistics """
+
+    result = ["%-14s %9s %9s %9s %7s %12s %12s %10s %10s" % ("Family", "Memory", "Disk", "Miss", "Hits", "Read", "Written", "Decompress", "Unpickle")]
+
+    for family in sorted(statistics):
+        counters = statistics[family]
+        requests = counters["transient"] + counters["disk"] + counters["miss"]
+        ratio = "%d%%" % (100 * (counters["transient"] + counters["disk"]) / requests) if requests else "-"
+
+        result.append("%-14s %9d %9d %9d %7s %12d %12d %8dms %8dms" % (family, counters["transient"], counters["disk"], counters["miss"], ratio,
+            counters["bytesRead"], counters["bytesWritten"], counters["decompressTime"] * 1000, counters["unpickleTime"] * 1000))
+
+    return "\n".join(result)
+
+
+
+class MemoryStore:
+    """
+    Size bounded in-memory storage with least-recently-used eviction. Limits
+    are given as maximum number of entries and/or maximum number of (estimated)
+    bytes. Values which are accessed or stored are moved to the end of the
+    queue while entries from the start are evicted when a limit is exceeded.
+    """
+
+    def __init__(self, maxEntries=None, maxBytes=None):
+        self.__entries = collections.OrderedDict()
+        self.__bytes = 0
+
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+    def getBytes(self):
+        """ Returns the sum of the estimated sizes of all entries """
+
+        return self.__bytes
+
+
+    def get(self, key, default=None):
+        """ Returns the value of the given key and marks it as recently used """
+
+        entries = self.__entries
+        if key in entries:
+            entries.move_to_end(key)
+            return entries[key][0]
+
+        return default
+
+
+    def put(self, key, value, size=None):
+        """ Stores the value under the given key. Size defaults to the shallow size of the value. """
+
+        if size is None:
+            size = sys.getsizeof(value)
+
+        entries = self.__entries
+        if key in entries:
+            self.__bytes -= entries[key][1]
+
+        entries[key] = (value, size)
+        entries.move_to_end(key)
+        self.__bytes += size
+
+        self.__evict()
+
+
+    def remove(self, key):
+        """ Removes the given key (if stored) """
+
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.__bytes -= entry[1]
+
+
+    def clear(self):
+        self.__entries.clear()
+        self.__bytes = 0
+
+
+    def __evict(self):
+        entries = self.__entries
+        maxEntries = self.maxEntries
+        maxBytes = self.maxBytes
+
+        # Always keep the most recent entry, even when it exceeds the limits on its own
+        while len(entries) > 1 and ((maxEntries is not None and len(entries) > maxEntries) or (maxBytes is not None and self.__bytes > maxBytes)):
+            key, entry = entries.popitem(last=False)
+            self.__bytes -= entry[1]
+
+
+
+class MemoryStorage:
+    """
+    Storage engine which keeps all entries in memory only. Useful for processes which
+    compute entries on behalf of another one (see Cache.exportEntries()).
+    """
+
+    def __init__(self, path=None):
+        self.__entries = {}
+
+    def clear(self):
+        self.__entries = {}
+
+    def info(self, key):
+        """ Returns a tuple of timestamp and checksum for the given key or None when the key is unknown """
+
+        entry = self.__entries.get(key)
+        return entry[1:] if entry is not None else None
+
+    def load(self, key):
+        """ Returns the (serialized) data of the given key """
+
+        entry = self.__entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, data, timestamp, checksum=None):
+        """ Stores the (serialized) data under the given key together with timestamp and checksum """
+
+        self.__entries[key] = (data, timestamp, checksum)
+
+    def touch(self, timestamps):
+        """ Updates the timestamps of the given entries (dict of key and timestamp) """
+
+        for key, timestamp in timestamps.items():
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries[key] = (entry[0], timestamp, entry[2])
+
+    def delete(self, keys):
+        for key in keys:
+            self.__entries.pop(key, None)
+
+    def keys(self):
+        return list(self.__entries)
+
+    def compact(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+    def openReader(self):
+        """ Returns a storage for reading the entries from a forked process """
+        return self
+
+
+
+class OverlayStorage:
+    """
+    Storage engine which keeps new entries in memory and reads all others from the
+    given (optional) base storage. The base storage is never modified. Used by forked
+    processes which must not write into the storage of their parent (see Cache.detach()).
+    Lists only the new entries.
     """
-    
-    __db = None
-    
-    def __init__(self, path, clear=False):
-        self.__transient = {}
+
+    def __init__(self, base=None):
+        self.__entries = {}
+        self.__base = base
+
+    def clear(self):
+        self.__entries = {}
+
+    def info(self, key):
+        """ Returns a tuple of timestamp and checksum for the given key or None when the key is unknown """
+
+        entry = self.__entries.get(key)
+        if entry is not None:
+            return entry[1:]
+
+        return self.__base.info(key) if self.__base is not None else None
+
+    def load(self, key):
+        """ Returns the (serialized) data of the given key """
+
+        entry = self.__entries.get(key)
+        if entry is not None:
+            return entry[0]
+
+        return self.__base.load(key) if self.__base is not None else None
+
+    def put(self, key, data, timestamp, checksum=None):
+        """ Stores the (serialized) data under the given key together with timestamp and checksum """
+
+        self.__entries[key] = (data, timestamp, checksum)
+
+    def touch(self, timestamps):
+        """ Updates the timestamps of the given new entries. Entries of the base storage are not modified. """
+
+        for key, timestamp in timestamps.items():
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries[key] = (entry[0], timestamp, entry[2])
+
+    def delete(self, keys):
+        for key in keys:
+            self.__entries.pop(key, None)
+
+    def keys(self):
+        return list(self.__entries)
+
+    def compact(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        if self.__base is not None:
+            self.__base.close()
+            self.__base = None
+
+    def openReader(self):
+        return self
+
+
+
+class DbmStorage:
+    """
+    Storage engine based on the dbm module of Python. Uses the same layout as the
+    shelve module did in earlier versions (pickled data, UTF-8 encoded keys, separate
+    "-timestamp" and "-checksum" keys) so that existing cache files keep working.
+    """
+
+    # Suffixes of the keys holding the meta data of an entry
+    __metaSuffixes = ("-timestamp", "-checksum")
+
+    def __init__(self, path, readonly=False):
+        self.__path = path
         self.__file = os.path.join(path, "jasycache")
-        
+        self.__db = None
+
         try:
-            self.__db = shelve.open(self.__file, flag="c")
-            
+            self.__db = dbm.open(self.__file, "r" if readonly else "c")
+
         except dbm.error as error:
+            if readonly:
+                raise IOError("Could not open cache file %s for reading: %s" % (self.__file, error))
+
             errno = None
             try:
                 errno = error.errno
             except:
                 pass
-                
-            if errno is 35:
+
+            if errno == 35:
                 raise IOError("Cache file is locked by another process! Maybe there is still another open Session/Project?")
-                
+
             elif "db type could not be determined" in str(error):
                 logging.error("Could not detect cache file format!")
                 logging.warn("Recreating cache database...")
                 self.clear()
-                
+
             else:
                 raise error
-    
-    
+
+
     def clear(self):
+        """ Clears the storage through re-creation of the file """
+
+        if self.__db is not None:
+            logging.debug("Closing cache file %s..." % self.__file)
+
+            self.__db.close()
+            self.__db = None
+
+        logging.debug("Clearing cache file %s..." % self.__file)
+        self.__db = dbm.open(self.__file, "n")
+
+
+    def info(self, key):
+        """ Returns a tuple of timestamp and checksum for the given key or None when the key is unknown """
+
+        db = self.__db
+        dataKey = key.encode("utf-8")
+        timeKey = (key + "-timestamp").encode("utf-8")
+
+        if dataKey in db and timeKey in db:
+            checksumKey = (key + "-checksum").encode("utf-8")
+            checksum = pickle.loads(db[checksumKey]) if checksumKey in db else None
+            return pickle.loads(db[timeKey]), checksum
+
+        return None
+
+
+    def load(self, key):
+        """ Returns the (serialized) data of the given key """
+
+        dataKey = key.encode("utf-8")
+        if dataKey in self.__db:
+            return self.__db[dataKey]
+
+        return None
+
+
+    def put(self, key, data, timestamp, checksum=None):
+        """ Stores the (serialized) data under the given key together with timestamp and checksum """
+
+        db = self.__db
+        db[(key + "-timestamp").encode("utf-8")] = pickle.dumps(timestamp)
+        if checksum:
+            db[(key + "-checksum").encode("utf-8")] = pickle.dumps(checksum)
+        db[key.encode("utf-8")] = data
+
+
+    def touch(self, timestamps):
+        """ Updates the timestamps of the given entries (dict of key and timestamp) """
+
+        db = self.__db
+        for key, timestamp in timestamps.items():
+            if key.encode("utf-8") in db:
+                db[(key + "-timestamp").encode("utf-8")] = pickle.dumps(timestamp)
+
+
+    def delete(self, keys):
+        """ Deletes the given keys including their meta data """
+
+        db = self.__db
+        for key in keys:
+            for name in (key, key + "-timestamp", key + "-checksum"):
+                encoded = name.encode("utf-8")
+                if encoded in db:
+                    del db[encoded]
+
+
+    def keys(self):
+        """ Returns a list of all keys which hold data """
+
+        result = []
+        for encoded in self.__db.keys():
+            key = encoded.decode("utf-8")
+            if not key.endswith(self.__metaSuffixes):
+                result.append(key)
+
+        return result
+
+
+    def compact(self):
         """
-        Clears the cache file through re-creation of the file
+        Re-creates the file with all complete entries. This drops orphaned meta data keys
+        (and data without timestamp) and releases the space of deleted entries.
         """
-        
-        if self.__db != None:
-            logging.debug("Closing cache file %s..." % self.__file)
-            
+
+        db = self.__db
+        tempFile = self.__file + "-compact"
+        temp = dbm.open(tempFile, "n")
+
+        for encoded in db.keys():
+            key = encoded.decode("utf-8")
+            if key.endswith(self.__metaSuffixes):
+                continue
+
+            timeKey = (key + "-timestamp").encode("utf-8")
+            if not timeKey in db:
+                continue
+
+            temp[encoded] = db[encoded]
+            temp[timeKey] = db[timeKey]
+
+            checksumKey = (key + "-checksum").encode("utf-8")
+            if checksumKey in db:
+                temp[checksumKey] = db[checksumKey]
+
+        db.close()
+        self.__db = db = dbm.open(self.__file, "n")
+
+        for encoded in temp.keys():
+            db[encoded] = temp[encoded]
+
+        temp.close()
+        for fileName in glob.glob(tempFile + "*"):
+            os.remove(fileName)
+
+
+    def sync(self):
+        if self.__db is not None and hasattr(self.__db, "sync"):
+            self.__db.sync()
+
+
+    def openReader(self):
+        """
+        Returns a storage for reading the entries from a forked process or None when the
+        file is locked by this process (depends on the dbm implementation).
+        """
+
+        try:
+            return DbmStorage(self.__path, readonly=True)
+        except IOError:
+            return None
+
+
+    def close(self):
+        if self.__db is not None:
             self.__db.close()
             self.__db = None
 
+
+
+class SqliteStorage:
+    """
+    Storage engine based on SQLite. Keeps data, timestamp and checksum of an entry in
+    one row. Uses the write-ahead log so that multiple processes (e.g. parallel
+    builds or the API writer) are able to read while another one writes. Writes are
+    collected and committed in batches to keep the time holding the write lock short.
+    """
+
+    # Number of pending writes to collect before committing them in one transaction
+    batchSize = 250
+
+    # Seconds to wait for a lock held by another process
+    timeout = 60
+
+    def __init__(self, path, readonly=False):
+        self.__path = path
+        self.__file = os.path.join(path, "jasycache.sqlite")
+        self.__pending = {}
+        self.__db = None
+
+        self.__open(readonly)
+
+
+    def __open(self, readonly=False):
+        try:
+            if readonly:
+                # Neither creates the file nor changes its journal mode
+                db = sqlite3.connect("file:%s?mode=ro" % pathname2url(os.path.abspath(self.__file)), uri=True, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+                db.execute("SELECT COUNT(*) FROM entries WHERE 0")
+
+            else:
+                # Access is serialized by the cache, which may write from a background thread
+                db = sqlite3.connect(self.__file, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, timestamp REAL, checksum TEXT)")
+
+        except sqlite3.DatabaseError as error:
+            raise IOError("Could not open cache file %s: %s" % (self.__file, error))
+
+        self.__db = db
+
+
+    def clear(self):
+        """ Clears the storage by deleting all entries """
+
         logging.debug("Clearing cache file %s..." % self.__file)
-        self.__db = shelve.open(self.__file, flag="n")
-        
-        
-    def read(self, key, timestamp=None):
-        """ 
+
+        self.__pending = {}
+        self.__db.execute("DELETE FROM entries")
+
+
+    def info(self, key):
+        """ Returns a tuple of timestamp and checksum for the given key or None when the key is unknown """
+
+        if key in self.__pending:
+            return self.__pending[key][1:]
+
+        return self.__db.execute("SELECT timestamp, checksum FROM entries WHERE key=?", (key,)).fetchone()
+
+
+    def load(self, key):
+        """ Returns the (serialized) data of the given key """
+
+        if key in self.__pending:
+            return self.__pending[key][0]
+
+        row = self.__db.execute("SELECT value FROM entries WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+    def put(self, key, data, timestamp, checksum=None):
+        """ Stores the (serialized) data under the given key together with timestamp and checksum """
+
+        self.__pending[key] = (data, timestamp, checksum)
+        if len(self.__pending) >= self.batchSize:
+            self.sync()
+
+
+    def touch(self, timestamps):
+        """ Updates the timestamps of the given entries (dict of key and timestamp) in one transaction """
+
+        self.sync()
+        self.__execute("UPDATE entries SET timestamp=? WHERE key=?", [(timestamp, key) for key, timestamp in timestamps.items()])
+
+
+    def delete(self, keys):
+        """ Deletes the given keys in one transaction """
+
+        for key in keys:
+            self.__pending.pop(key, None)
+
+        self.__execute("DELETE FROM entries WHERE key=?", [(key,) for key in keys])
+
+
+    def keys(self):
+        """ Returns a list of all keys """
+
+        self.sync()
+        return [row[0] for row in self.__db.execute("SELECT key FROM entries")]
+
+
+    def compact(self):
+        """ Rebuilds the database file to release the space of deleted entries """
+
+        self.sync()
+        self.__db.execute("VACUUM")
+
+
+    def sync(self):
+        """ Commits all pending writes in one transaction """
+
+        if self.__db is None or not self.__pending:
+            return
+
+        rows = [(key, data, timestamp, checksum) for key, (data, timestamp, checksum) in self.__pending.items()]
+        self.__pending = {}
+
+        self.__execute("INSERT OR REPLACE INTO entries (key, value, timestamp, checksum) VALUES (?, ?, ?, ?)", rows)
+
+
+    def __execute(self, statement, rows):
+        """ Executes the given statement for all rows in one transaction """
+
+        if not rows:
+            return
+
+        db = self.__db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(statement, rows)
+            db.execute("COMMIT")
+        except:
+            db.execute("ROLLBACK")
+            raise
+
+
+    def close(self):
+        if self.__db is not None:
+            self.sync()
+            self.__db.close()
+            self.__db = None
+
+
+    def openReader(self):
+        """ Returns a storage for reading the entries from a forked process (using its own connection) """
+
+        return SqliteStorage(self.__path)
+
+
+
+storages = {
+    "memory" : MemoryStorage,
+    "dbm" : DbmStorage,
+    "sqlite" : SqliteStorage
+}
+
+
+class Cache:
+    """
+    A cache class based on a pluggable storage engine (dbm or SQLite). Supports
+    transient in-memory storage, too. Uses memory storage for caching requests to DB
+    as well for improved performance. Uses keys for identification of entries like a
+    normal hash table / dictionary.
+
+    The in-memory storage is split into two size bounded tiers: one for heavy entries
+    (parsed trees) and one for all other (light) entries. Limits are tuples of
+    maximum entries and maximum bytes and default to the module's heavyLimits/lightLimits.
+
+    With writeBehind enabled values are still serialized by store(), but written to
+    the storage by a background thread in batches. Pending writes are flushed by
+    sync(), close() and all other methods which work on the whole storage.
+
+    Serialized values larger than the module's compressionThreshold are compressed
+    using the given compression method ("zlib", "lzma" or None to disable). Compressed
+    entries carry a small header so that they coexist with uncompressed (older) entries.
+    """
+
+    __storage = None
+    __queue = None
+    __exported = None
+
+    # Maximum number of queued writes handled by the background thread at once
+    writeBatchSize = 100
+
+    def __init__(self, path, clear=False, storage="dbm", heavy=None, light=None, writeBehind=False, compression="zlib"):
+        if compression is not None and not compression in compressionMethods:
+            raise ValueError("Unsupported cache compression: %s" % compression)
+
+        self.__compression = compression
+        self.__statistics = {}
+        self.__lock = threading.RLock()
+        self.__pending = {}
+        self.__accessed = {}
+        self.__heavy = MemoryStore(*(heavy or heavyLimits))
+        self.__light = MemoryStore(*(light or lightLimits))
+
+        if not storage in storages:
+            raise ValueError("Unsupported cache storage: %s" % storage)
+
+        self.__storage = storages[storage](path)
+
+        if clear:
+            self.clear()
+
+        if writeBehind:
+            self.__queue = queue.Queue()
+            self.__thread = threading.Thread(target=self.__write, name="CacheWriter")
+            self.__thread.daemon = True
+            self.__thread.start()
+
+
+    def __write(self):
+        """ Main loop of the background thread which writes the queued values """
+
+        pending = self.__pending
+        entries = self.__queue
+
+        while True:
+            batch = [entries.get()]
+            while len(batch) < self.writeBatchSize:
+                try:
+                    batch.append(entries.get_nowait())
+                except queue.Empty:
+                    break
+
+            with self.__lock:
+                for key in batch:
+                    # Multiple stores of the same key are written once
+                    entry = pending.pop(key, None) if key is not None else None
+                    if entry is not None:
+                        try:
+                            self.__storage.put(key, *entry)
+                        except Exception as error:
+                            logging.error("Failed to write cache entry %s: %s" % (key, error))
+
+            for key in batch:
+                entries.task_done()
+
+            if None in batch:
+                break
+
+
+    def detach(self):
+        """
+        Prepares the cache for use in a forked process which must not write into (or share
+        the handles of) the storage of the parent. The in-memory tiers copied by fork are kept.
+        Entries are read through a new handle of the storage (when supported by the engine),
+        while new entries are collected in memory and returned by exportEntries().
+        The parent should sync() the cache before forking.
+        """
+
+        # The writer thread is not copied by fork and the lock might be in any state
+        self.__queue = None
+        self.__lock = threading.RLock()
+
+        # Keep a reference to the handles of the parent which must not be closed here
+        self.__parentStorage = self.__storage
+        self.__storage = OverlayStorage(self.__storage.openReader())
+        self.__exported = set()
+        self.__accessed = {}
+
+
+    def flush(self):
+        """ Waits until all queued writes are written to the storage """
+
+        if self.__queue is not None:
+            self.__queue.join()
+
+
+    def clear(self):
+        """
+        Clears the cache file
+        """
+
+        self.flush()
+
+        self.__heavy.clear()
+        self.__light.clear()
+        self.__storage.clear()
+
+
+    def setLimits(self, heavy=None, light=None):
+        """
+        Configures the limits of the in-memory tiers. Each limit is a tuple of
+        maximum entries and maximum bytes (None disables the particular limit).
+        """
+
+        if heavy is not None:
+            self.__heavy.maxEntries, self.__heavy.maxBytes = heavy
+
+        if light is not None:
+            self.__light.maxEntries, self.__light.maxBytes = light
+
+
+    def __getTier(self, key):
+        return self.__heavy if getFamily(key) in heavyFamilies else self.__light
+
+
+    def __getCounters(self, key):
+        family = getFamily(key)
+        statistics = self.__statistics
+        if not family in statistics:
+            statistics[family] = dict.fromkeys(statisticsFields, 0)
+
+        return statistics[family]
+
+
+    def getStatistics(self):
+        """
+        Returns the usage counters of this cache split by key family (e.g. "tree", "meta").
+        Each family holds the number of hits from memory ("transient") and from the storage
+        ("disk"), the number of misses, the number of bytes read from and written to the
+        storage and the time spent unpickling values (in seconds).
+        """
+
+        return mergeStatistics({}, self.__statistics)
+
+
+    def read(self, key, timestamp=None, checksum=None):
+        """
         Reads the given value from cache.
-        Optionally support to check wether the value was stored after the given 
+        Optionally support to check wether the value was stored after the given
         time to be valid (useful for comparing with file modification times).
+
+        When a checksum is given and the entry was stored with one, the entry is
+        validated by comparing checksums instead (useful for content digests which
+        survive fresh checkouts and touched files). Entries without a stored
+        checksum fall back to the timestamp check.
         """
-        
-        if key in self.__transient:
-            return self.__transient[key]
-        
-        timeKey = key + "-timestamp"
-        if key in self.__db and timeKey in self.__db:
-            if not timestamp or timestamp <= self.__db[timeKey]:
-                value = self.__db[key]
-                
-                # Useful to debug serialized size. Often a performance
-                # issue when data gets to big.
-                # rePacked = pickle.dumps(value)
-                # print("LEN: %s = %s" % (key, len(rePacked)))
-                
-                # Copy over value to in-memory cache
-                self.__transient[key] = value
-                return value
-                
+
+        tier = self.__getTier(key)
+        counters = self.__getCounters(key)
+
+        if key in tier:
+            counters["transient"] += 1
+            return tier.get(key)
+
+        with self.__lock:
+            if key in self.__pending:
+                data, storedTimestamp, storedChecksum = self.__pending[key]
+                info = storedTimestamp, storedChecksum
+            else:
+                data = None
+                info = self.__storage.info(key)
+
+        if info is not None:
+            storedTimestamp, storedChecksum = info
+            if checksum and storedChecksum:
+                valid = checksum == storedChecksum
+            else:
+                valid = not timestamp or timestamp <= storedTimestamp
+
+            if valid:
+                if data is None:
+                    with self.__lock:
+                        data = self.__storage.load(key)
+
+                if data is not None:
+                    # The entry is still valid at this time, which keeps it through the retention of collectGarbage()
+                    now = time.time()
+                    if storedTimestamp < now - refreshInterval:
+                        self.__accessed[key] = now
+
+                    counters["disk"] += 1
+                    counters["bytesRead"] += len(data)
+
+                    start = time.time()
+                    data = decompressData(data)
+                    counters["decompressTime"] += time.time() - start
+
+                    start = time.time()
+                    value = pickle.loads(data)
+                    counters["unpickleTime"] += time.time() - start
+
+                    # Copy over value to in-memory cache
+                    tier.put(key, value, len(data))
+                    return value
+
+        counters["miss"] += 1
         return None
-        
-    
-    def store(self, key, value, timestamp=None, transient=False):
+
+
+    def store(self, key, value, timestamp=None, transient=False, checksum=None, size=None):
         """
         Stores the given value.
         Default timestamp goes to the current time. Can be modified
-        to the time of an other files modification date etc.
+        to the time of an other files modification date etc. The optional
+        checksum is stored alongside and preferred by read() for validation.
+        The optional size is used as estimated memory usage of the value in the
+        in-memory tiers. Otherwise the serialized size is used.
         """
-        
-        self.__transient[key] = value
+
+        tier = self.__getTier(key)
+
         if transient:
+            tier.put(key, value, size)
             return
-        
+
         if not timestamp:
             timestamp = time.time()
-        
+
         try:
-            self.__db[key+"-timestamp"] = timestamp
-            self.__db[key] = value
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
         except pickle.PicklingError as err:
             logging.error("Failed to store enty: %s" % key)
+            tier.put(key, value, size)
+            return
+
+        tier.put(key, value, size or len(data))
+
+        if self.__compression and len(data) >= compressionThreshold:
+            data = compressData(data, self.__compression)
+
+        self.__getCounters(key)["bytesWritten"] += len(data)
+
+        if self.__queue is not None:
+            with self.__lock:
+                self.__pending[key] = (data, timestamp, checksum)
+            self.__queue.put(key)
+
+        else:
+            self.__storage.put(key, data, timestamp, checksum)
+
+
+    def exportEntries(self, new=False):
+        """
+        Returns all entries of the storage as a list of tuples of key, serialized data,
+        timestamp and checksum. The list can be passed to importEntries() of another cache.
+        With new enabled a detached cache only returns the entries which were not exported
+        before (see detach()), so that workers can export their results after every task.
+        """
+
+        self.flush()
+
+        storage = self.__storage
+        with self.__lock:
+            keys = storage.keys()
+            if new and self.__exported is not None:
+                keys = [key for key in keys if not key in self.__exported]
+                self.__exported.update(keys)
+
+            return [(key, storage.load(key)) + tuple(storage.info(key)) for key in keys]
+
+
+    def importEntries(self, entries):
+        """ Stores the given entries (as returned by exportEntries()) unmodified in the storage """
+
+        for key, data, timestamp, checksum in entries:
+            self.__getTier(key).remove(key)
+            self.__getCounters(key)["bytesWritten"] += len(data)
+
+            if self.__queue is not None:
+                with self.__lock:
+                    self.__pending[key] = (data, timestamp, checksum)
+                self.__queue.put(key)
+
+            else:
+                self.__storage.put(key, data, timestamp, checksum)
+
+
+    def collectGarbage(self, valid=None, retention=None):
+        """
+        Deletes outdated entries from the storage and compacts it afterwards. Entries are
+        outdated when the given valid callback returns False for the key or when they
+        were stored or last read more than retention seconds ago (reads refresh the time
+        at most once per refreshInterval). Returns the number of deleted entries.
+        """
+
+        self.flush()
+        self.__touch()
+
+        storage = self.__storage
+        threshold = time.time() - retention if retention else None
+
+        outdated = []
+        for key in storage.keys():
+            if valid is not None and not valid(key):
+                outdated.append(key)
+
+            elif threshold is not None:
+                info = storage.info(key)
+                if info is None or info[0] < threshold:
+                    outdated.append(key)
+
+        storage.delete(outdated)
+        for key in outdated:
+            self.__getTier(key).remove(key)
+
+        storage.compact()
+        return len(outdated)
+
+
+    def __touch(self):
+        """ Stores the timestamps of the entries which were read since the last call """
+
+        with self.__lock:
+            if self.__accessed and self.__storage is not None:
+                self.__storage.touch(self.__accessed)
+                self.__accessed = {}
+
 
-        
     def sync(self):
         """ Syncs the internal storage database """
-        
-        if self.__db is not None:
-            self.__db.sync() 
-      
-      
+
+        if self.__storage is not None:
+            self.flush()
+            self.__touch()
+            with self.__lock:
+                self.__storage.sync()
+
+
     def close(self):
         """ Closes the internal storage database """
-        
-        if self.__db is not None:
-            self.__db.close()  
-            self.__db = None       
-        
-      
\ No newline at end of file
+
+        if self.__queue is not None:
+            self.__queue.put(None)
+            self.__thread.join()
+            self.__queue = None
+
+        if self.__storage is not None:
+            self.__touch()
+            self.__storage.close()
+            self.__storage = None
+
+
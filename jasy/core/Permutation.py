@@ -12,43 +12,61 @@ PermutationCache = {}
 
 
 def getPermutation(combination):
-    """ Small wrapper to omit double creation of identical permutations in filter() method """
+    """
+    Returns the interned permutation of the given combination. Identical combinations
+    (same key) always return the same permutation object.
+    """
     
-    key = str(combination)
+    key = buildKey(combination)
     if key in PermutationCache:
         return PermutationCache[key]
         
-    PermutationCache[key] = Permutation(combination)
+    PermutationCache[key] = Permutation(combination, key)
     return PermutationCache[key]
 
 
+def buildKey(combination):
+    """ Computes the permutations' key based on the given combination """
+    
+    result = []
+    for key in sorted(combination):
+        value = combination[key]
+        
+        # Basic translation like in JavaScript frontend
+        # We don't have a special threadment for strings, numbers, etc.
+        if value == True:
+            value = "true"
+        elif value == False:
+            value = "false"
+        elif value == None:
+            value = "null"
+        
+        result.append("%s:%s" % (key, value))
+
+    return ";".join(result)
+
+
 class Permutation:
-    def __init__(self, combination):
+    """
+    A combination of field values. Permutations are compared and hashed by their key. Use
+    getPermutation() to get interned instances.
+    """
+    
+    def __init__(self, combination, key=None):
         
         self.__combination = combination
-        self.__key = self.__buildKey(combination)
+        self.__key = key if key is not None else buildKey(combination)
+        self.__hash = hash(self.__key)
         self.__checksum = None
+        self.__filtered = {}
         
         
-    def __buildKey(self, combination):
-        """ Computes the permutations' key based on the given combination """
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Permutation) and self.__key == other.__key)
         
-        result = []
-        for key in sorted(combination):
-            value = combination[key]
-            
-            # Basic translation like in JavaScript frontend
-            # We don't have a special threadment for strings, numbers, etc.
-            if value == True:
-                value = "true"
-            elif value == False:
-                value = "false"
-            elif value == None:
-                value = "null"
-            
-            result.append("%s:%s" % (key, value))
-
-        return ";".join(result)
+        
+    def __hash__(self):
+        return self.__hash
         
         
     def has(self, key):
@@ -102,9 +120,17 @@ class Permutation:
     
     
     def filter(self, available):
-        filtered = {}
-        for key in self.__combination:
-            if key in available:
-                filtered[key] = self.__combination[key]
+        """
+        Returns the interned permutation which only contains the given keys. Results are
+        cached per set of keys. Passing the same frozenset each time avoids conversions.
+        """
+        
+        if not isinstance(available, frozenset):
+            available = frozenset(available)
+        
+        filtered = self.__filtered.get(available)
+        if filtered is None:
+            combination = self.__combination
+            filtered = self.__filtered[available] = getPermutation(dict([(key, combination[key]) for key in combination if key in available]))
         
-        return getPermutation(filtered)
+        return filtered
@@ -12,10 +12,13 @@ from jasy.core.Error import *
         
 class Project():
     
-    def __init__(self, path):
+    def __init__(self, path, cacheStorage="dbm", cacheWriteBehind=False):
         """
         Constructor call of the project. 
         First param is the path of the project relative to the current working directory.
+        The optional cacheStorage selects the storage engine of the project cache ("dbm", "sqlite" or "memory").
+        The SQLite engine allows multiple processes to share the cache of one project.
+        With cacheWriteBehind enabled cache entries are written by a background thread.
         """
         
         path = os.path.normpath(path)
@@ -24,11 +27,12 @@ class Project():
         
         # Only store and work with full path
         self.__path = os.path.abspath(path)
+        self.__sharedCache = None
 
 
         # Initialize cache
         try:
-            self.__cache = Cache(self.__path)
+            self.__cache = Cache(self.__path, storage=cacheStorage, writeBehind=cacheWriteBehind)
         except IOError as err:
             raise JasyError("Could not initialize project. Cache file could not be initialized! %s" % err)
         
@@ -92,7 +96,7 @@ class Project():
 
 
     __dirFilter = [".svn", ".git", ".hg", ".bzr"]
-    __internalFiles = ("jasyproject.json", "jasyscript.py", "jasycache", "jasycache.db"),
+    __internalFiles = ("jasyproject.json", "jasyscript.py", "jasycache", "jasycache.db", "jasycache.sqlite", "jasycache.sqlite-wal", "jasycache.sqlite-shm")
 
 
     def __str__(self):
@@ -117,10 +121,45 @@ class Project():
         
     def getCache(self):
         return self.__cache
+
+
+    def getSharedCache(self):
+        """ Returns the content-addressed cache shared with other projects/checkouts (or None) """
+        return self.__sharedCache
+
+
+    def setSharedCache(self, cache):
+        """ Configures the content-addressed cache shared with other projects/checkouts """
+        self.__sharedCache = cache
     
     
     def clearCache(self):
         self.__cache.clear()
+
+
+    def collectGarbage(self, retention=None):
+        """
+        Removes cache entries of classes which are not part of the project anymore and 
+        (optionally) entries which are older than the given retention time in seconds. 
+        Compacts the cache file afterwards. Returns the number of removed entries.
+        """
+        
+        classes = self.getClasses() or {}
+        ids = set([classObj.getId() for classObj in classes.values()])
+        
+        def valid(key):
+            # Keys without class identifier are left-overs of earlier versions
+            start = key.find("[")
+            if start == -1:
+                return False
+                
+            end = key.find("]", start)
+            return key[start+1:end] in ids
+        
+        removed = self.__cache.collectGarbage(valid, retention)
+        logging.info("Removed %s outdated cache entries from project %s", removed, self.__name)
+        
+        return removed
         
         
     def close(self):
@@ -3,13 +3,14 @@
 # Copyright 2010-2012 Sebastian Werner
 #
 
-import logging, itertools, time, atexit, json
+import logging, itertools, time, atexit, json, os, multiprocessing
 
 from jasy.i18n.Translation import Translation
 from jasy.i18n.LocaleData import *
 
 from jasy.core.Project import Project
-from jasy.core.Permutation import Permutation
+from jasy.core.Permutation import getPermutation
+from jasy.core.Cache import Cache, mergeStatistics, formatStatistics
 
 from jasy.util.Profiler import *
 from jasy.util.File import *
@@ -19,6 +20,57 @@ from jasy.util.File import *
 __all__ = ["Session"]
 
 
+# Default location of the cache shared between projects and checkouts (overridable via JASY_CACHE)
+sharedCachePath = os.path.join(os.path.expanduser("~"), ".jasy", "cache")
+
+
+# Session, classes and permutations of the running warmup (inherited by forked workers)
+warming = None
+
+
+def detachWarmupSession():
+    """ Initializer of the forked warmup workers """
+
+    warming[0].detachCaches()
+
+
+def warmupClasses(task):
+    """
+    Worker of Session.warmup() which runs in a forked process. Computes the data of the classes
+    with the given indexes re-using the objects of the parent and returns the new cache entries.
+    """
+
+    session, classes, permutations = warming
+    start, end = task
+
+    for classObj in classes[start:end]:
+        classObj.warmup(permutations)
+
+    return session.exportCacheEntries(new=True)
+
+
+# Session, build function and jobs of the running build matrix (inherited by forked workers)
+matrix = None
+
+
+def detachMatrixSession():
+    """ Initializer of the forked build matrix workers """
+
+    matrix[0].detachCaches()
+
+
+def runMatrixJob(index):
+    """ Runs the job with the given index of the build matrix and returns its time and the new cache entries """
+
+    session, build, jobs = matrix
+    permutation, locale = jobs[index]
+
+    start = time.time()
+    build(permutation, locale)
+
+    return index, time.time() - start, session.exportCacheEntries()
+
+
 def toJSON(obj, sort_keys=False):
     return json.dumps(obj, separators=(',',':'), ensure_ascii=False, sort_keys=sort_keys)
     
@@ -34,6 +86,8 @@ class Session():
         self.__timestamp = time.time()
         self.__projects = []
         self.__fields = {}
+        self.__cacheStatistics = None
+        self.__sharedCache = None
     
     
     def clearCache(self):
@@ -44,17 +98,302 @@ class Session():
         for project in self.getProjects():
             project.clearCache()
 
+
+    def useSharedCache(self, path=None):
+        """
+        Enables a content-addressed cache which is shared between all projects of the session
+        and with other checkouts/workspaces on the same user account or machine. Entries are
+        keyed by the digest of the class source, the Jasy version and the processing options,
+        so that parsed and compressed results of identical sources are re-used. The path defaults
+        to the JASY_CACHE environment variable or ~/.jasy/cache.
+        """
+
+        if self.__sharedCache is not None:
+            return
+
+        path = path or os.environ.get("JASY_CACHE") or sharedCachePath
+        makeDir(path)
+
+        logging.info("Using shared cache: %s" % path)
+
+        # Values are kept in memory by the project caches already
+        self.__sharedCache = Cache(path, storage="sqlite", heavy=(1, None), light=(1, None))
+
+        for project in self.__projects:
+            project.setSharedCache(self.__sharedCache)
+
+    def collectGarbage(self, retention=None):
+        """
+        Removes outdated entries from the caches of all known projects and compacts them.
+        Entries older than the optional retention time (in seconds) are removed as well.
+        """
+
+        logging.info("Collecting cache garbage...")
+        for project in self.getProjects():
+            project.collectGarbage(retention)
+
+        # Shared entries are only identified by content, so just the retention time applies
+        if self.__sharedCache is not None and retention:
+            removed = self.__sharedCache.collectGarbage(retention=retention)
+            logging.info("Removed %s outdated entries from shared cache", removed)
+
+    def warmup(self, processes=None):
+        """
+        Precomputes the permutation keys, translation usage, meta data and scope data of all
+        classes of all projects for all permutations of the session and stores them in the
+        project caches. Classes which are cached already are skipped. The remaining classes
+        are processed by the given number of processes (defaults to the number of CPUs).
+        Requires the fork start method of multiprocessing for parallel processing, otherwise
+        classes are processed one after another, just like in daemonic processes (e.g. the
+        workers of buildMatrix()).
+        """
+
+        self.__warmup(self.getPermutations(), processes)
+
+
+    def __warmup(self, permutations, processes):
+        """
+        Implementation of warmup() for the given permutations. Returns the classes which were
+        processed by other processes. Their data is only available from the cache storage.
+        """
+
+        global warming
+
+        work = []
+        for project in self.__projects:
+            work.extend([classObj for classObj in project.getClasses().values() if not classObj.isWarm(permutations)])
+
+        total = len(work)
+        if not total:
+            logging.info("Cache is warm already")
+            return []
+
+        processes = min(processes or multiprocessing.cpu_count(), total)
+
+        # Daemonic processes are not allowed to have children
+        if processes > 1 and multiprocessing.current_process().daemon:
+            processes = 1
+
+        # Forked workers share the classes and the hash seed of this process and so compute identical data
+        if processes > 1 and not "fork" in multiprocessing.get_all_start_methods():
+            logging.warn("Parallel warmup requires the fork start method. Warming up one class after another...")
+            processes = 1
+
+        logging.info("Warming up cache for %s classes using %s processes..." % (total, processes))
+
+        if processes == 1:
+            for classObj in work:
+                classObj.warmup(permutations)
+
+            return []
+
+        # Multiple small tasks per process balance the differing class sizes
+        size = max(1, total // (processes * 4))
+        tasks = [(pos, pos+size) for pos in range(0, total, size)]
+
+        # Workers read the entries of the parent through the storage
+        for project in self.__projects:
+            project.getCache().sync()
+
+        if self.__sharedCache is not None:
+            self.__sharedCache.sync()
+
+        warming = (self, work, permutations)
+        pool = multiprocessing.get_context("fork").Pool(processes, initializer=detachWarmupSession)
+
+        try:
+            for entries in pool.imap_unordered(warmupClasses, tasks):
+                self.importCacheEntries(entries)
+        except:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+            warming = None
+
+        return work
+
+
+    def buildMatrix(self, build, permutations=None, locales=None, processes=None):
+        """
+        Calls the given build function for every permutation (defaults to all permutations of
+        the session) and optionally every given locale (True uses all available translations)
+        using a pool of processes (defaults to the number of CPUs). The function is called with
+        the permutation and the locale (None when no locales are given).
+
+        For parallel builds the per-class data shared by all builds is computed upfront (see
+        warmup()). Cache entries created by the builds are stored in the project caches afterwards.
+        Requires the fork start method of multiprocessing for parallel builds, otherwise builds run
+        one after another. The builds run in daemonic processes which are not allowed to have
+        children, so nested parallelism like storeCompressed() with processes other than 1 or
+        warmup() is serialized inside them. Returns a list of dictionaries with permutation,
+        locale and time (in seconds) of each build.
+        """
+
+        global matrix
+
+        if permutations is None:
+            permutations = self.getPermutations()
+
+        if locales is True:
+            locales = sorted(self.getAvailableTranslations())
+
+        jobs = [(permutation, locale) for permutation in permutations for locale in (locales or [None])]
+        processes = min(processes or multiprocessing.cpu_count(), len(jobs))
+
+        if processes > 1 and not "fork" in multiprocessing.get_all_start_methods():
+            logging.warn("Parallel builds require the fork start method. Building one after another...")
+            processes = 1
+
+        if processes > 1:
+            # Load the per-class data into memory so that forked workers share it even when they cannot read the storage.
+            # Classes which were checked by the warmup already are in memory, only the ones of other processes are missing.
+            for classObj in self.__warmup(permutations, processes):
+                classObj.isWarm(permutations)
+
+            for project in self.__projects:
+                project.getCache().sync()
+
+            if self.__sharedCache is not None:
+                self.__sharedCache.sync()
+
+        logging.info("Running %s builds using %s processes..." % (len(jobs), processes))
+
+        times = [None] * len(jobs)
+        if processes == 1:
+            for index, (permutation, locale) in enumerate(jobs):
+                start = time.time()
+                build(permutation, locale)
+                times[index] = time.time() - start
+
+        else:
+            matrix = (self, build, jobs)
+            pool = multiprocessing.get_context("fork").Pool(processes, initializer=detachMatrixSession)
+
+            try:
+                results = list(pool.imap_unordered(runMatrixJob, range(len(jobs))))
+            except:
+                pool.terminate()
+                raise
+            else:
+                pool.close()
+            finally:
+                pool.join()
+                matrix = None
+
+            for index, duration, entries in results:
+                times[index] = duration
+                self.importCacheEntries(entries)
+
+        result = []
+        for index, (permutation, locale) in enumerate(jobs):
+            logging.info("Built %s%s in %.2fs" % (permutation, " (%s)" % locale if locale else "", times[index]))
+            result.append({
+                "permutation" : str(permutation),
+                "locale" : locale,
+                "time" : times[index]
+            })
+
+        return result
+
+
+    def detachCaches(self):
+        """
+        Prepares the caches of all projects (and the shared cache) for use in a forked process.
+        New cache entries are collected in memory afterwards (see exportCacheEntries()).
+        """
+
+        for project in self.__projects:
+            project.getCache().detach()
+
+        if self.__sharedCache is not None:
+            self.__sharedCache.detach()
+
+
+    def exportCacheEntries(self, new=False):
+        """
+        Returns the entries of the detached caches as a tuple of entries per project path and shared entries.
+        With new enabled only the entries which were not exported before are returned (see Cache.exportEntries()).
+        """
+
+        projects = dict([(project.getPath(), project.getCache().exportEntries(new)) for project in self.__projects])
+        shared = self.__sharedCache.exportEntries(new) if self.__sharedCache is not None else []
+
+        return projects, shared
+
+
+    def importCacheEntries(self, entries):
+        """ Stores the entries returned by exportCacheEntries() of another process in the caches """
+
+        projects, shared = entries
+        for project in self.__projects:
+            if project.getPath() in projects:
+                project.getCache().importEntries(projects[project.getPath()])
+
+        if self.__sharedCache is not None:
+            self.__sharedCache.importEntries(shared)
+
+
+    def getCacheStatistics(self):
+        """
+        Returns the cache usage counters of all known projects as a JSON compatible
+        structure: "total" holds the counters per key family summed up over all projects,
+        "projects" the counters per family of each project (by name). After closing the
+        session the final counters are returned.
+        """
+
+        if self.__projects is None:
+            return self.__cacheStatistics
+
+        result = {
+            "total" : {},
+            "projects" : {}
+        }
+
+        for project in self.__projects:
+            statistics = project.getCache().getStatistics()
+            result["projects"][project.getName()] = statistics
+            mergeStatistics(result["total"], statistics)
+
+        if self.__sharedCache is not None:
+            result["shared"] = self.__sharedCache.getStatistics()
+
+        return result
+
+
+    def writeCacheStatistics(self, fileName):
+        """
+        Writes the cache usage counters (see getCacheStatistics()) as JSON to the given file
+        """
+
+        writeFile(fileName, toJSON(self.getCacheStatistics(), sort_keys=True))
+
+
     def close(self):
         """
         Closes the session and stores cache to the harddrive.
+        Logs a summary of the cache usage before.
         """
 
         if self.__projects:
+            self.__cacheStatistics = self.getCacheStatistics()
+            if self.__cacheStatistics["total"]:
+                logging.info("Cache statistics:\n%s" % formatStatistics(self.__cacheStatistics["total"]))
+
+            if self.__cacheStatistics.get("shared"):
+                logging.info("Shared cache statistics:\n%s" % formatStatistics(self.__cacheStatistics["shared"]))
+
             logging.info("Closing session...")
             for project in self.getProjects():
                 project.close()
             
             self.__projects = None
+
+        if self.__sharedCache is not None:
+            self.__sharedCache.close()
+            self.__sharedCache = None
     
     
     def getClassByName(self, className):
@@ -86,6 +425,9 @@ class Session():
         
         self.__projects.append(project)
         
+        if self.__sharedCache is not None:
+            project.setSharedCache(self.__sharedCache)
+        
         # Import project defined fields which might be configured using "activateField()"
         fields = project.getFields()
         for name in fields:
@@ -241,7 +583,7 @@ class Session():
         # Thanks to eumiro via http://stackoverflow.com/questions/3873654/combinations-from-dictionary-with-list-values-using-python
         names = sorted(values)
         combinations = [dict(zip(names, prod)) for prod in itertools.product(*(values[name] for name in names))]
-        permutations = [Permutation(combi) for combi in combinations]
+        permutations = [getPermutation(combi) for combi in combinations]
 
         logging.info("Detected %s possible permutations", len(permutations))
 
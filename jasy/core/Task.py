@@ -17,6 +17,24 @@ def executeTask(name):
     else:
         raise JasyError("No such task: %s" % name)
         
+def addSessionTasks(session, retention=30*24*60*60):
+    """ 
+    Registers the ready-made tasks which work on the given session:
+    
+    - gc: Removes cache entries of deleted classes and entries older than retention seconds
+    - warmup: Precomputes the cached data of all classes for all permutations in parallel
+    """
+    
+    def gc():
+        session.collectGarbage(retention)
+        
+    Task(gc, "Removes outdated entries from the project caches and compacts them")
+    
+    def warmup():
+        session.warmup()
+        
+    Task(warmup, "Precomputes meta and scope data of all classes for all permutations")
+    
 def printTasks():
     for name in __tasks__:
         obj = __tasks__[name]
@@ -3,7 +3,7 @@
 # Copyright 2010-2012 Sebastian Werner
 #
 
-import logging, re, copy, json
+import logging, re, json, hashlib
 
 try:
     import polib
@@ -13,20 +13,25 @@ except ImportError:
 
 from jasy.js.parse.Node import Node
 
-__all__ = ["TranslationError", "Translation", "hasText"]
+__all__ = ["TranslationError", "Translation", "hasText", "isTextCall"]
+
+
+def isTextCall(node):
+    """ Whether the given call node calls one of the translation functions tr(), trc() or trn() """
+    
+    funcName = None
+    
+    if node[0].type == "identifier":
+        funcName = node[0].value
+    elif node[0].type == "dot" and node[0][1].type == "identifier":
+        funcName = node[0][1].value
+    
+    return funcName in ("tr", "trc", "trn")
 
 
 def hasText(node):
-    if node.type == "call":
-        funcName = None
-        
-        if node[0].type == "identifier":
-            funcName = node[0].value
-        elif node[0].type == "dot" and node[0][1].type == "identifier":
-            funcName = node[0][1].value
-        
-        if funcName in ("tr", "trc", "trn"):
-            return True
+    if node.type == "call" and isTextCall(node):
+        return True
             
     # Process children
     for child in node:
@@ -45,6 +50,7 @@ class TranslationError(Exception):
 class Translation:
     def __init__(self, locale, files=None, table=None):
         self.__locale = locale
+        self.__checksum = None
 
         logging.debug("Initialize translation: %s" % locale)
         self.__table = {}
@@ -83,6 +89,15 @@ class Translation:
         pass
         # TODO
         
+    def getChecksum(self):
+        """ Returns a checksum of the locale and the translated texts """
+        
+        if self.__checksum is None:
+            content = json.dumps([self.__locale, self.__table], sort_keys=True, ensure_ascii=False)
+            self.__checksum = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        
+        return self.__checksum
+        
         
     def __str__(self):
         return "Translation(%s)" % self.__locale
@@ -137,7 +152,7 @@ class Translation:
                 except KeyError:
                     raise TranslationError("Invalid positional value: %s in %s" % (entry, value))
                 
-                copied = copy.deepcopy(mapper[pos])
+                copied = mapper[pos].clone()
                 if copied.type not in ("identifier", "call"):
                     copied.parenthesized = True
                 pair.append(copied)
@@ -3,9 +3,12 @@
 # Copyright 2010-2012 Sebastian Werner
 #
 
-import os, logging, copy, hashlib
+import os, logging, hashlib
+
+import jasy
 
 import jasy.js.parse.Parser as Parser
+import jasy.js.parse.Serializer as Serializer
 import jasy.js.parse.ScopeScanner as ScopeScanner
 
 import jasy.js.clean.DeadCode
@@ -15,37 +18,18 @@ import jasy.js.clean.Permutate
 import jasy.js.output.Optimization
 
 from jasy.js.api.Data import ApiData
-from jasy.js.MetaData import MetaData
+from jasy.js.ClassFacts import ClassFacts
 from jasy.js.output.Compressor import Compressor
 
 from jasy.js.util import *
 
-from jasy.i18n.Translation import hasText
-
-
 
 aliases = {}
 
-__all__ = ["Class", "Error"]
-
+# Rough ratio between the in-memory size of a parsed tree and the size of its source
+treeSizeFactor = 35
 
-def collectPermutationKeys(node, keys=None):
-    
-    if keys is None:
-        keys = set()
-    
-    # Always the first parameter
-    # Supported calls: core.Env.isSet(key, expected?), core.Env.getValue(key), core.Env.select(key, map)
-    calls = ("core.Env.isSet", "core.Env.getValue", "core.Env.select")
-    if node.type == "dot" and node.parent.type == "call" and assembleDot(node) in calls:
-        keys.add(node.parent[1][0].value)
-
-    # Process children
-    for child in reversed(node):
-        if child != None:
-            collectPermutationKeys(child, keys)
-            
-    return keys
+__all__ = ["Class", "Error"]
 
 
 class Error(Exception):
@@ -60,7 +44,13 @@ class Error(Exception):
 class Class():
     def __init__(self, path, project=None):
         self.__path = path
-        self.__mtime = os.stat(path).st_mtime
+        
+        stat = os.stat(path)
+        self.__mtime = stat.st_mtime
+        self.__size = stat.st_size
+        self.__checksum = None
+        self.__contentId = None
+        self.__permutationKeys = None
         
         if project:
             self.__project = project
@@ -70,6 +60,7 @@ class Class():
             self.__localPath = os.path.relpath(path, project.getClassPath())
             self.__id = self.__localPath[:-3]
         else:
+            self.__project = None
             self.__root = os.path.dirname(path)
             self.__package = ""
             self.__cache = Cache(self.__root)
@@ -115,28 +106,105 @@ class Class():
         """Returns last modification time of the class"""
         return self.__mtime
 
+    def getChecksum(self):
+        """
+        Returns the SHA1 digest of the file content. The digest is cached together with the 
+        modification time and size of the file so that it is only re-computed when one of them
+        changed (e.g. after a fresh checkout or touching the file).
+        """
+        
+        if self.__checksum is None:
+            field = "checksum[%s]" % self.__id
+            entry = self.__cache.read(field)
+            
+            if entry is not None and entry[0] == self.__mtime and entry[1] == self.__size:
+                self.__checksum = entry[2]
+            else:
+                self.__checksum = hashlib.sha1(open(self.__path, mode="rb").read()).hexdigest()
+                self.__cache.store(field, (self.__mtime, self.__size, self.__checksum))
+                
+        return self.__checksum
+
+    def __getContentId(self):
+        """
+        Returns the identifier of the class in the shared cache. It is computed from the content
+        digest, the class name (which is stored in the tree) and the Jasy version.
+        """
+        
+        if self.__contentId is None:
+            content = "%s-%s-%s" % (self.getChecksum(), self.__name, jasy.__version__)
+            self.__contentId = hashlib.sha1(content.encode("utf-8")).hexdigest()
+            
+        return self.__contentId
+        
+    def __read(self, field, size=None):
+        """
+        Reads the given field from the project cache. Falls back to the shared cache (if
+        configured) and copies found entries into the project cache.
+        """
+        
+        value = self.__cache.read(field, self.__mtime, self.getChecksum())
+        if value is None:
+            shared = self.__project.getSharedCache() if self.__project else None
+            if shared is not None:
+                value = shared.read(field.replace("[%s]" % self.__id, "[%s]" % self.__getContentId(), 1))
+                if value is not None:
+                    self.__cache.store(field, value, checksum=self.getChecksum(), size=size)
+                    
+        return value
+        
+    def __store(self, field, value, size=None):
+        """ Stores the given field in the project cache and the shared cache (if configured) """
+        
+        self.__cache.store(field, value, checksum=self.getChecksum(), size=size)
+        
+        shared = self.__project.getSharedCache() if self.__project else None
+        if shared is not None:
+            shared.store(field.replace("[%s]" % self.__id, "[%s]" % self.__getContentId(), 1), value, size=size)
+
     def getText(self):
         """Reads the file (as UTF-8) and returns the text"""
         return open(self.__path, mode="r", encoding="utf-8").read()
 
 
-    def getTree(self, permutation=None, cleanup=True):
+    def __getTreeData(self, comments=False):
         """
-        Returns the tree (of nodes from the parser) of the class. This parses the class,
-        creates the tree, applies and optional permutation, scans for variables usage 
-        and puts the tree into the cache before returning it. The cache works with the
-        permutation, so every permutated tree is cached separately.
+        Returns the unmodified tree of the class in the compact tree serialization. The class
+        is parsed only once this way, while deserializing the data is a fast way to create
+        copies for the different permutations. Without comments the tree only keeps the meta
+        data tags of doc comments. The cache key includes the version of the serialization.
+        """
+        
+        field = "tree[%s]-raw%s-%s" % (self.__id, Serializer.version, comments)
+        data = self.__read(field)
+        if data is None:
+            data = Serializer.serialize(Parser.parse(self.getText(), self.__name, comments=comments))
+            self.__store(field, data)
+            
+        return data
+
+
+    def getTree(self, permutation=None, cleanup=True, comments=False):
+        """
+        Returns the tree (of nodes from the parser) of the class. This creates a copy
+        of the parsed tree (see __getTreeData()), applies and optional permutation, scans
+        for variables usage and puts the tree into the cache before returning it. The cache
+        works with the permutation, so every permutated tree is cached separately. These trees
+        are only kept in memory as they are cheap to derive from the persisted parsed tree
+        and must not be modified afterwards.
+        Comments are only attached when requested, otherwise only the meta data tags of doc
+        comments are kept (see MetaData).
         """
         
         permutation = self.filterPermutation(permutation)
         
-        field = "tree[%s]-%s-%s" % (self.__id, permutation, cleanup)
-        tree = self.__cache.read(field, self.__mtime)
+        field = "tree[%s]-%s-%s-%s" % (self.__id, permutation, cleanup, comments)
+        tree = self.__cache.read(field)
         if tree is not None:
             return tree
             
-        # Parse tree
-        tree = Parser.parse(self.getText(), self.__name)
+        # Create a copy of the parsed tree
+        tree = Serializer.deserialize(self.__getTreeData(comments))
 
         # Apply permutation
         if permutation:
@@ -153,7 +221,7 @@ class Class():
         if cleanup:
             jasy.js.clean.Unused.cleanup(tree)
         
-        self.__cache.store(field, tree, self.__mtime, True)
+        self.__cache.store(field, tree, transient=True, size=self.__size * treeSizeFactor)
         return tree
 
 
@@ -219,68 +287,95 @@ class Class():
         return result
         
         
-    def getScopeData(self, permutation=None):
+    def getFacts(self, permutation=None):
         """
-        Returns the top level scope object which contains information about the
-        global variable and package usage/influence.
+        Returns the facts about the tree of the class (see ClassFacts) which hold the permutation
+        keys, the translation usage, the meta data and the scope data. They are collected in one
+        pass and cached as one entry per permutation.
         """
         
         permutation = self.filterPermutation(permutation)
         
-        field = "scope[%s]-%s" % (self.__id, permutation)
-        scope = self.__cache.read(field, self.__mtime)
-        if scope is None:
-            scope = self.getTree(permutation).scope
-            self.__cache.store(field, scope, self.__mtime)
+        field = "facts[%s]-%s" % (self.__id, permutation)
+        facts = self.__read(field)
+        if facts is None:
+            facts = ClassFacts(self.getTree(permutation))
+            self.__store(field, facts)
+            
+        return facts
+        
+        
+    def getScopeData(self, permutation=None):
+        """
+        Returns the top level scope object which contains information about the
+        global variable and package usage/influence.
+        """
         
-        return scope
+        return self.getFacts(permutation).scope
         
         
     def getApi(self):
         field = "api[%s]" % self.__id
-        apidata = self.__cache.read(field, self.__mtime)
+        apidata = self.__read(field)
         if apidata is None:
-            apidata = ApiData(self.getTree(cleanup=False), self.__name)
-            self.__cache.store(field, apidata, self.__mtime)
+            apidata = ApiData(self.getTree(cleanup=False, comments=True), self.__name)
+            self.__store(field, apidata)
 
         return apidata
         
         
     def getMetaData(self, permutation=None):
-        permutation = self.filterPermutation(permutation)
-        
-        field = "meta[%s]-%s" % (self.__id, permutation)
-        meta = self.__cache.read(field, self.__mtime)
-        if meta is None:
-            meta = MetaData(self.getTree(permutation))
-            self.__cache.store(field, meta, self.__mtime)
-            
-        return meta
+        return self.getFacts(permutation).meta
         
         
     def getPermutationKeys(self):
-        field = "permutations[%s]" % (self.__id)
-        keys = self.__cache.read(field, self.__mtime)
-        if keys is None:
-            keys = collectPermutationKeys(self.getTree())
-            self.__cache.store(field, keys, self.__mtime)
-        
-        return keys
+        return self.getFacts().permutationKeys
 
 
     def usesTranslation(self):
-        field = "translation[%s]" % (self.__id)
-        result = self.__cache.read(field, self.__mtime)
-        if result is None:
-            result = hasText(self.getTree())
-            self.__cache.store(field, result, self.__mtime)
+        return self.getFacts().translation
         
-        return result
+        
+    def warmup(self, permutations=None):
+        """
+        Computes the facts (permutation keys, translation usage, meta and scope data) for
+        all distinct filtered permutations of the given list, so that they are available
+        from the cache afterwards.
+        """
+        
+        self.getFacts()
+        
+        done = set()
+        for permutation in permutations or [None]:
+            permutation = self.filterPermutation(permutation)
+            key = str(permutation)
+            if key in done:
+                continue
+            
+            done.add(key)
+            self.getFacts(permutation)
+        
+        
+    def isWarm(self, permutations=None):
+        """ Whether all data computed by warmup() is available from the cache """
+        
+        if self.__read("facts[%s]-None" % self.__id) is None:
+            return False
+            
+        for permutation in permutations or [None]:
+            permutation = self.filterPermutation(permutation)
+            if self.__read("facts[%s]-%s" % (self.__id, permutation)) is None:
+                return False
+                
+        return True
         
         
     def filterPermutation(self, permutation):
         if permutation:
-            keys = self.getPermutationKeys()
+            keys = self.__permutationKeys
+            if keys is None:
+                keys = self.__permutationKeys = frozenset(self.getPermutationKeys())
+                
             if keys:
                 return permutation.filter(keys)
 
@@ -294,19 +389,32 @@ class Class():
         return None
         
         
+    def __getCompressedField(self, permutation, translation, optimization, format):
+        field = "%s-%s-%s-%s" % (permutation, translation and translation.getChecksum(), optimization, format)
+        return "compressed[%s]-%s" % (self.__id, hashlib.md5(field.encode("utf-8")).hexdigest())
+        
+        
+    def hasCompressed(self, permutation=None, translation=None, optimization=None, format=None):
+        """ Whether the result of getCompressed() with the given parameters is available from the cache """
+        
+        permutation = self.filterPermutation(permutation)
+        translation = self.filterTranslation(translation)
+        
+        return self.__read(self.__getCompressedField(permutation, translation, optimization, format)) is not None
+        
+        
     def getCompressed(self, permutation=None, translation=None, optimization=None, format=None):
         permutation = self.filterPermutation(permutation)
         translation = self.filterTranslation(translation)
         
-        field = "compressed[%s]-%s-%s-%s-%s" % (self.__id, permutation, translation, optimization, format)
-        field = hashlib.md5(field.encode("utf-8")).hexdigest()
+        field = self.__getCompressedField(permutation, translation, optimization, format)
         
-        compressed = self.__cache.read(field, self.__mtime)
+        compressed = self.__read(field)
         if compressed == None:
             tree = self.getTree(permutation)
             
             if translation or optimization:
-                tree = copy.deepcopy(tree)
+                tree = tree.clone()
             
                 if translation:
                     translation.patch(tree)
@@ -318,7 +426,7 @@ class Class():
                         raise Error(self, "Could not compress class! %s" % error)
                 
             compressed = Compressor(format).compress(tree)
-            self.__cache.store(field, compressed, self.__mtime)
+            self.__store(field, compressed)
             
         return compressed
             
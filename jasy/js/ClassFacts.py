@@ -0,0 +1,74 @@
+#
+# Jasy - Web Tooling Framework
+# Copyright 2010-2012 Sebastian Werner
+#
+
+import jasy.js.parse.ScopeScanner as ScopeScanner
+
+from jasy.js.MetaData import MetaData
+from jasy.js.util import assembleDot
+from jasy.i18n.Translation import isTextCall
+
+__all__ = ["ClassFacts"]
+
+
+# Calls which query permutation values. The key is always the first parameter.
+# Supported calls: core.Env.isSet(key, expected?), core.Env.getValue(key), core.Env.select(key, map)
+permutationCalls = ("core.Env.isSet", "core.Env.getValue", "core.Env.select")
+
+
+class ClassFacts:
+    """
+    Data structure to hold everything the build needs to know about the tree of a class:
+
+    * Permutation keys used by the class (permutationKeys)
+    * Whether the class uses translation functions (translation)
+    * Meta data of the doc comments (meta, see MetaData)
+    * Top level scope data with the global variable and package usage (scope, see ScopeData)
+
+    All data besides the scope is collected in a single pass over the tree. The scope data is
+    the one attached by the ScopeScanner which is executed for every tree anyway. Like
+    MetaData this is a clean data class for optimal cachability using Pickle.
+    """
+
+    __slots__ = ["permutationKeys", "translation", "meta", "scope"]
+
+    def __init__(self, tree):
+        self.permutationKeys = set()
+        self.translation = False
+        self.meta = MetaData()
+
+        scope = getattr(tree, "scope", None)
+        if scope is None:
+            scope = ScopeScanner.scan(tree)
+
+        self.scope = scope
+
+        self.__inspect(tree)
+
+
+    def __inspect(self, tree):
+        """ The internal inspection routine. Iterates using an explicit stack in document order. """
+
+        keys = self.permutationKeys
+        meta = self.meta
+
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+
+            if node.type == "call":
+                if node[0].type == "dot" and assembleDot(node[0]) in permutationCalls:
+                    keys.add(node[1][0].value)
+
+                if not self.translation and isTextCall(node):
+                    self.translation = True
+
+            comments = getattr(node, "comments", None)
+            if comments:
+                meta.addComments(comments)
+
+            # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
+            for child in reversed(node):
+                if child is not None:
+                    stack.append(child)
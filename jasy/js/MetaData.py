@@ -16,7 +16,7 @@ class MetaData:
     
     __slots__ = ["name", "requires", "optionals", "breaks", "assets"]
     
-    def __init__(self, tree):
+    def __init__(self, tree=None):
         self.name = None
         
         self.requires = set()
@@ -24,34 +24,41 @@ class MetaData:
         self.breaks = set()
         self.assets = set()
         
-        self.__inspect(tree)
+        if tree is not None:
+            self.__inspect(tree)
         
         
+    def addComments(self, comments):
+        """ Adds the meta data tags of the given comments (of a single node) """
+        
+        for comment in comments:
+            commentTags = comment.getTags()
+            if commentTags:
+
+                if "name" in commentTags:
+                    self.name = list(commentTags["name"])[0]
+                if "require" in commentTags:
+                    self.requires.update(commentTags["require"])
+                if "load" in commentTags:
+                    # load is a special combination shorthand for requires + breaks
+                    # This means load it but don't require it being loaded first
+                    self.requires.update(commentTags["load"])
+                    self.breaks.update(commentTags["load"])
+                if "optional" in commentTags:
+                    self.optionals.update(commentTags["optional"])
+                if "break" in commentTags:
+                    self.breaks.update(commentTags["break"])
+                if "asset" in commentTags:
+                    self.assets.update(commentTags["asset"])
+                    
+                    
     def __inspect(self, node):
         """ The internal inspection routine """
     
         # Parse comments
         comments = getattr(node, "comments", None)
         if comments:
-            for comment in comments:
-                commentTags = comment.getTags()
-                if commentTags:
-
-                    if "name" in commentTags:
-                        self.name = list(commentTags["name"])[0]
-                    if "require" in commentTags:
-                        self.requires.update(commentTags["require"])
-                    if "load" in commentTags:
-                        # load is a special combination shorthand for requires + breaks
-                        # This means load it but don't require it being loaded first
-                        self.requires.update(commentTags["load"])
-                        self.breaks.update(commentTags["load"])
-                    if "optional" in commentTags:
-                        self.optionals.update(commentTags["optional"])
-                    if "break" in commentTags:
-                        self.breaks.update(commentTags["break"])
-                    if "asset" in commentTags:
-                        self.assets.update(commentTags["asset"])
+            self.addComments(comments)
 
         # Process children
         for child in node:
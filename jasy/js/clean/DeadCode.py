@@ -47,91 +47,104 @@ It can figure out combined expressions as well like:
 
 """
 
-__all__ = ["cleanup"]
+__all__ = ["cleanup", "visitor"]
 
 import logging
 
+from jasy.js.parse.Visitor import Visitor, walk
+
+
 def cleanup(node):
     """
     Reprocesses JavaScript to remove dead paths 
     """
     
     logging.debug(">>> Removing dead code branches...")
-    return __cleanup(node)
+    
+    deadCode = visitor()
+    walk(node, deadCode)
+    return deadCode.modified
 
 
-def __cleanup(node):
+def visitor():
     """
-    Reprocesses JavaScript to remove dead paths 
+    Returns the visitor which removes dead paths. Processes from inside to outside
+    so it can be combined with other visitors which do the same.
     """
     
-    optimized = False
+    return Visitor(leave=__leave)
+
+
+def __cleanupIf(node, visitor):
+    """ Optimize if cases """
     
-    # Process from inside to outside
-    for child in reversed(node):
-        # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
-        if child != None:
-            if __cleanup(child):
-                optimized = True
+    check = __checkCondition(node.condition)
+    if check is not None:
+        visitor.modified = True
         
-    # Optimize if cases
-    if node.type == "if":
-        check = __checkCondition(node.condition)
-        if check is not None:
-            optimized = True
+        if check is True:
+            node.parent.replace(node, node.thenPart)
             
-            if check is True:
-                node.parent.replace(node, node.thenPart)
-                
-            elif check is False:
-                if hasattr(node, "elsePart"):
-                    node.parent.replace(node, node.elsePart)
-                else:
-                    node.parent.remove(node)
+        elif check is False:
+            if hasattr(node, "elsePart"):
+                node.parent.replace(node, node.elsePart)
+            else:
+                node.parent.remove(node)
+
+
+def __cleanupHook(node, visitor):
+    """ Optimize hook statement """
+    
+    check = __checkCondition(node[0])
+    if check is not None:
+        visitor.modified = True
     
-    # Optimize hook statement
-    if node.type == "hook":
-        check = __checkCondition(node[0])
-        if check is not None:
-            optimized = True
+        if check is True:
+            node.parent.replace(node, node[1])
+        elif check is False:
+            node.parent.replace(node, node[2])
+
+
+def __cleanupSwitch(node, visitor):
+    """ Optimize switch statement """
+    
+    if node.discriminant.type not in ("string", "number"):
+        return
         
-            if check is True:
-                node.parent.replace(node, node[1])
-            elif check is False:
-                node.parent.replace(node, node[2])
-                
-    # Optimize switch statement
-    if node.type == "switch" and node.discriminant.type in ("string", "number"):
-        discriminant = node.discriminant.value
-        fallback = None
-        matcher = None
-        allowed = ["default", "case"]
+    discriminant = node.discriminant.value
+    fallback = None
+    matcher = None
+    
+    for child in node:
+        # Require that every case block ends with a break (no fall-throughs)
+        if child.type == "case":
+            block = child[len(child)-1]
+            if len(block) == 0 or block[len(block)-1].type != "break":
+                logging.warn("Could not optimize switch statement (at line %s) because of fallthrough break statement." % node.line)
+                return
+
+        if child.type == "default":
+            fallback = child.statements
+
+        elif child.type == "case" and child.label.value == discriminant:
+            matcher = child.statements
+            
+            # Remove break statement
+            matcher.pop()
         
-        for child in node:
-            # Require that every case block ends with a break (no fall-throughs)
-            if child.type == "case":
-                block = child[len(child)-1]
-                if len(block) == 0 or block[len(block)-1].type != "break":
-                    logging.warn("Could not optimize switch statement (at line %s) because of fallthrough break statement." % node.line)
-                    return False
-
-            if child.type == "default":
-                fallback = child.statements
-
-            elif child.type == "case" and child.label.value == discriminant:
-                matcher = child.statements
-                
-                # Remove break statement
-                matcher.pop()
+    if matcher or fallback:
+        if not matcher:
+            matcher = fallback
             
-        if matcher or fallback:
-            if not matcher:
-                matcher = fallback
-                
-            node.parent.replace(node, matcher)
-            optimized = True
-    
-    return optimized
+        node.parent.replace(node, matcher)
+        visitor.modified = True
+
+
+__leave = {
+    "if" : __cleanupIf,
+    "hook" : __cleanupHook,
+    "switch" : __cleanupSwitch
+}
 
 
 
@@ -6,6 +6,11 @@ from jasy.js.util import *
 __all__ = ["patch"]
 
 
+# Parsed replacements by code. Replacements only depend on the value of a key, so
+# they are shared by all permutations using it.
+__parsed = {}
+
+
 def __translateToJS(code):
     """ Returns the code equivalent of the stored value for the given key """
     
@@ -25,85 +30,97 @@ def __translateToJS(code):
     return code
     
 
+def __parse(code):
+    """ Returns the parsed expression of the given code. Callers must clone it before inserting it into a tree. """
+    
+    try:
+        return __parsed[code]
+    except KeyError:
+        parsed = __parsed[code] = parseExpression(code)
+        return parsed
+
+
 def patch(node, permutation):
-    """ Replaces all occourences with incoming values """
+    """
+    Replaces all occourences with incoming values. The calls are looked up using the index
+    of the tree and processed from inside to outside.
+    """
 
     modified = False
     
-    if node.type == "dot" and node.parent.type == "call":
-        assembled = assembleDot(node)
-        
-        # core.Env.getValue(key)
-        if assembled == "core.Env.getValue" and node.parent.type == "call":
-            callNode = node.parent
-            params = callNode[1]
-            replacement = __translateToJS(permutation.get(params[0].value))
-            if replacement:
-                replacementNode = parseExpression(replacement)
-                callNode.parent.replace(callNode, replacementNode)
-                modified = True            
-        
-        # core.Env.isSet(key, expected)
-        # also supports boolean like: core.Env.isSet(key)
-        elif assembled == "core.Env.isSet" and node.parent.type == "call":
-            callNode = node.parent
-            params = callNode[1]
-            name = params[0].value
-            replacement = __translateToJS(permutation.get(name))
+    calls = node.getIndex().getCalls(("core.Env.isSet", "core.Env.getValue", "core.Env.select"))
+    for callNode in reversed(calls):
+        if __patchCall(callNode, permutation):
+            modified = True
             
-            if replacement != None:
-                # Auto-fill second parameter with boolean "true"
-                expected = params[1] if len(params) > 1 else parseExpression("true")
+    return modified
 
-                if expected.type in ("string", "number", "true", "false"):
-                    parsedReplacement = parseExpression(replacement)
-                    expectedValue = getattr(expected, "value", None)
-                    
-                    if expectedValue is not None:
-                        if getattr(parsedReplacement, "value", None) is not None:
-                            replacementResult = parsedReplacement.value in str(expected.value).split("|")
-                        else:
-                            replacementResult = parsedReplacement.type in str(expected.value).split("|")
-                    else:
-                        replacementResult = parsedReplacement.type == expected.type
 
-                    # Do actual replacement
-                    replacementNode = parseExpression("true" if replacementResult else "false")
-                    callNode.parent.replace(callNode, replacementNode)
-                    modified = True
+def __patchCall(callNode, permutation):
+    """ Replaces the given call with the incoming value. Returns whether it was replaced. """
+    
+    assembled = assembleDot(callNode[0])
+    
+    # core.Env.getValue(key)
+    if assembled == "core.Env.getValue":
+        params = callNode[1]
+        replacement = __translateToJS(permutation.get(params[0].value))
+        if replacement:
+            replacementNode = __parse(replacement).clone()
+            callNode.parent.replace(callNode, replacementNode)
+            return True
+    
+    # core.Env.isSet(key, expected)
+    # also supports boolean like: core.Env.isSet(key)
+    elif assembled == "core.Env.isSet":
+        params = callNode[1]
+        name = params[0].value
+        replacement = __translateToJS(permutation.get(name))
         
-        # core.Env.select(key, map)
-        elif assembled == "core.Env.select" and node.parent.type == "call":
-            callNode = node.parent
-            params = callNode[1]
-            replacement = __translateToJS(permutation.get(params[0].value))
-            if replacement:
-                parsedReplacement = parseExpression(replacement)
-                if parsedReplacement.type != "string":
-                    raise Exception("core.Env.select requires that the given replacement is of type string.")
-
-                # Directly try to find matching identifier in second param (map)
-                objectInit = params[1]
-                if objectInit.type == "object_init":
-                    fallbackNode = None
-                    for propertyInit in objectInit:
-                        if propertyInit[0].value == "default":
-                            fallbackNode = propertyInit[1]
-
-                        elif parsedReplacement.value in str(propertyInit[0].value).split("|"):
-                            callNode.parent.replace(callNode, propertyInit[1])
-                            modified = True
-                            break
-
-                    if not modified and fallbackNode is not None:
-                        callNode.parent.replace(callNode, fallbackNode)
-                        modified = True
-
-
-    # Process children
-    for child in reversed(node):
-        if child != None:
-            if patch(child, permutation):
-                modified = True
-
-    return modified
\ No newline at end of file
+        if replacement != None:
+            # Auto-fill second parameter with boolean "true"
+            expected = params[1] if len(params) > 1 else __parse("true")
+
+            if expected.type in ("string", "number", "true", "false"):
+                parsedReplacement = __parse(replacement)
+                expectedValue = getattr(expected, "value", None)
+                
+                if expectedValue is not None:
+                    if getattr(parsedReplacement, "value", None) is not None:
+                        replacementResult = parsedReplacement.value in str(expected.value).split("|")
+                    else:
+                        replacementResult = parsedReplacement.type in str(expected.value).split("|")
+                else:
+                    replacementResult = parsedReplacement.type == expected.type
+
+                # Do actual replacement
+                replacementNode = __parse("true" if replacementResult else "false").clone()
+                callNode.parent.replace(callNode, replacementNode)
+                return True
+    
+    # core.Env.select(key, map)
+    elif assembled == "core.Env.select":
+        params = callNode[1]
+        replacement = __translateToJS(permutation.get(params[0].value))
+        if replacement:
+            parsedReplacement = __parse(replacement)
+            if parsedReplacement.type != "string":
+                raise Exception("core.Env.select requires that the given replacement is of type string.")
+
+            # Directly try to find matching identifier in second param (map)
+            objectInit = params[1]
+            if objectInit.type == "object_init":
+                fallbackNode = None
+                for propertyInit in objectInit:
+                    if propertyInit[0].value == "default":
+                        fallbackNode = propertyInit[1]
+
+                    elif parsedReplacement.value in str(propertyInit[0].value).split("|"):
+                        callNode.parent.replace(callNode, propertyInit[1])
+                        return True
+
+                if fallbackNode is not None:
+                    callNode.parent.replace(callNode, fallbackNode)
+                    return True
+                    
+    return False
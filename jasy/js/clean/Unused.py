@@ -4,6 +4,7 @@
 #
 
 from jasy.js.parse.Node import Node
+from jasy.js.parse.Visitor import Visitor, walk, skip
 import jasy.js.parse.ScopeScanner as ScopeScanner
 import logging
 
@@ -38,7 +39,11 @@ def cleanup(node):
     while True:
         x = x + 1
         logging.debug("Removing unused variables [Iteration: %s]..." % x)
-        if __cleanup(node):
+        
+        visitor = Visitor(leave=__cleanupLeave)
+        walk(node, visitor)
+        
+        if visitor.modified:
             ScopeScanner.scan(node)
             cleaned = True
         else:
@@ -52,41 +57,25 @@ def cleanup(node):
 # Implementation
 #
 
-def __cleanup(node):
+def __cleanupScope(node, visitor):
     """ The scanner part which looks for scopes with unused variables/params """
     
-    cleaned = False
-    
-    for child in list(node):
-        if child != None and __cleanup(child):
-            cleaned = True
-
-    if node.type == "script" and node.scope.unused and hasattr(node, "parent"):
-        if __recurser(node, node.scope.unused):
-            cleaned = True
-
-    return cleaned
+    if node.scope.unused and hasattr(node, "parent"):
+        recurser = Visitor(__recurserEnter, __recurserLeave, node.scope.unused)
+        walk(node, recurser)
+        
+        if recurser.modified:
+            visitor.modified = True
             
             
             
-def __recurser(node, unused):
-    """ 
-    The cleanup part which always processes one scope and cleans up params and
-    variable definitions which are unused
-    """
-    
-    retval = False
-    
-    # Process children
-    if node.type != "function":
-        for child in node:
-            # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
-            if child != None:
-                if __recurser(child, unused):
-                    retval = True
-                    
+# The cleanup part which always processes one scope and cleans up params and
+# variable definitions which are unused. Does not process inner functions.
 
-    if node.type == "script" and hasattr(node, "parent"):
+def __recurseScript(node, visitor):
+    unused = visitor.state
+    
+    if hasattr(node, "parent"):
         # Remove unused parameters
         params = getattr(node.parent, "params", None)
         if params:
@@ -96,7 +85,7 @@ def __recurser(node, unused):
                 if identifier.value in unused:
                     logging.debug("Removing unused parameter '%s' in line %s", identifier.value, identifier.line)
                     params.remove(identifier)
-                    retval = True
+                    visitor.modified = True
                 else:
                     break
 
@@ -106,77 +95,93 @@ def __recurser(node, unused):
             if funcName != None and funcName in unused:
                 logging.debug("Removing unused function name at line %s" % node.line)
                 del node.parent.name
-                retval = True
+                visitor.modified = True
                     
                     
-    elif node.type == "function":
-        # Remove full unused functions (when not in top-level scope)
-        if node.functionForm == "declared_form" and getattr(node, "parent", None) and node.parent.type != "call":
-            funcName = getattr(node, "name", None)
-            if funcName != None and funcName in unused:
-                logging.debug("Removing unused function declaration %s at line %s" % (funcName, node.line))
-                node.parent.remove(node)
-                retval = True
+def __recurseFunction(node, visitor):
+    unused = visitor.state
+    
+    # Remove full unused functions (when not in top-level scope)
+    if node.functionForm == "declared_form" and getattr(node, "parent", None) and node.parent.type != "call":
+        funcName = getattr(node, "name", None)
+        if funcName != None and funcName in unused:
+            logging.debug("Removing unused function declaration %s at line %s" % (funcName, node.line))
+            node.parent.remove(node)
+            visitor.modified = True
             
     
-    elif node.type == "var":
-        for decl in reversed(node):
-            if getattr(decl, "name", None) in unused:
-                if hasattr(decl, "initializer"):
-                    init = decl.initializer
-                    if init.type in ("null", "this", "true", "false", "identifier", "number", "string", "regexp"):
-                        logging.debug("Removing unused primitive variable %s at line %s" % (decl.name, decl.line))
-                        node.remove(decl)
-                        retval = True
-                        
-                    elif init.type == "function" and (not hasattr(init, "name") or init.name in unused):
-                        logging.debug("Removing unused function variable %s at line %s" % (decl.name, decl.line))
-                        node.remove(decl)
-                        retval = True
+def __recurseVar(node, visitor):
+    unused = visitor.state
+
+    for decl in reversed(node):
+        if getattr(decl, "name", None) in unused:
+            if hasattr(decl, "initializer"):
+                init = decl.initializer
+                if init.type in ("null", "this", "true", "false", "identifier", "number", "string", "regexp"):
+                    logging.debug("Removing unused primitive variable %s at line %s" % (decl.name, decl.line))
+                    node.remove(decl)
+                    visitor.modified = True
                     
-                    # If we have only one child, we replace the whole var statement with just the init block
-                    elif len(node) == 1:
-                        semicolon = Node(init.tokenizer, "semicolon")
-                        semicolon.append(init, "expression")
-
-                        # Protect non-expressions with parens
-                        if init.type in ("array_init", "object_init"):
-                            init.parenthesized = True
-                        
-                        node.parent.replace(node, semicolon)
-                        retval = True
+                elif init.type == "function" and (not hasattr(init, "name") or init.name in unused):
+                    logging.debug("Removing unused function variable %s at line %s" % (decl.name, decl.line))
+                    node.remove(decl)
+                    visitor.modified = True
+                
+                # If we have only one child, we replace the whole var statement with just the init block
+                elif len(node) == 1:
+                    semicolon = Node(init.tokenizer, "semicolon")
+                    semicolon.append(init, "expression")
+
+                    # Protect non-expressions with parens
+                    if init.type in ("array_init", "object_init"):
+                        init.parenthesized = True
+                    
+                    node.parent.replace(node, semicolon)
+                    visitor.modified = True
 
-                    # If we are the last declaration, move it out of node and append after var block
-                    elif node[-1] == decl or node[0] == decl:
-                        isFirst = node[0] == decl
-                        
-                        node.remove(decl)
-                        nodePos = node.parent.index(node)
-                        semicolon = Node(init.tokenizer, "semicolon")
-                        semicolon.append(init, "expression")
-
-                        # Protect non-expressions with parens
-                        if init.type in ("array_init", "object_init"):
-                            init.parenthesized = True
-
-                        if isFirst:
-                            node.parent.insert(nodePos, semicolon)
-                        else:
-                            node.parent.insert(nodePos + 1, semicolon)
-                            
-                        retval = True
-                        
-                    else:
-                        logging.debug("Could not automatically remove unused variable %s at line %s without possible side-effects" % (decl.name, decl.line))
+                # If we are the last declaration, move it out of node and append after var block
+                elif node[-1] == decl or node[0] == decl:
+                    isFirst = node[0] == decl
                     
-                else:
                     node.remove(decl)
-                    retval = True
-                    
-        if len(node) == 0:
-            logging.debug("Removing empty 'var' block at line %s" % node.line)
-            node.parent.remove(node)
+                    nodePos = node.parent.index(node)
+                    semicolon = Node(init.tokenizer, "semicolon")
+                    semicolon.append(init, "expression")
 
-    return retval
+                    # Protect non-expressions with parens
+                    if init.type in ("array_init", "object_init"):
+                        init.parenthesized = True
 
-    
\ No newline at end of file
+                    if isFirst:
+                        node.parent.insert(nodePos, semicolon)
+                    else:
+                        node.parent.insert(nodePos + 1, semicolon)
+                        
+                    visitor.modified = True
+                    
+                else:
+                    logging.debug("Could not automatically remove unused variable %s at line %s without possible side-effects" % (decl.name, decl.line))
+                
+            else:
+                node.remove(decl)
+                visitor.modified = True
+                
+    if len(node) == 0:
+        logging.debug("Removing empty 'var' block at line %s" % node.line)
+        node.parent.remove(node)
+
+
+
+__cleanupLeave = {
+    "script" : __cleanupScope
+}
+
+__recurserEnter = {
+    "function" : skip
+}
+
+__recurserLeave = {
+    "script" : __recurseScript,
+    "function" : __recurseFunction,
+    "var" : __recurseVar
+}
@@ -4,6 +4,7 @@
 #
 
 from jasy.js.parse.Node import Node
+from jasy.js.parse.Visitor import Visitor, walk
 from jasy.js.output.Compressor import Compressor
 from jasy.js.parse.Lang import expressionOrder, expressions
 
@@ -19,17 +20,13 @@ class Error(Exception):
 
 def optimize(node):
     logging.debug(">>> Reducing block complexity...")
-    return __optimize(node, Compressor())
+    
+    # Process from inside to outside
+    walk(node, Visitor(leave=__leave, state=Compressor()))
 
 
-def __optimize(node, compressor):
-    # Process from inside to outside
-    # on a copy of the node to prevent it from forgetting children when structure is modified
-    for child in list(node):
-        # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
-        if child != None:
-            __optimize(child, compressor)
-    
+def __optimize(node, visitor):
+    compressor = visitor.state
     
     # Cleans up empty semicolon statements (or pseudo-empty)
     if node.type == "semicolon" and node.parent.type in ("block", "script"):
@@ -179,6 +176,12 @@ def __optimize(node, compressor):
             compactIf(node, thenPart, condition)
 
 
+__leave = {
+    "*" : __optimize
+}
+
+
+
 def reworkElse(node, elsePart):
     """ 
     If an if ends with a return/throw we are able to inline the content 
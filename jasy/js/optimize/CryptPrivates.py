@@ -5,6 +5,8 @@
 
 import zlib, string, logging, re
 
+from jasy.js.parse.Visitor import Visitor, walk
+
 __all__ = ["optimize", "Error"]
 
 
@@ -28,7 +30,9 @@ def optimize(node, contextId=""):
     
     logging.debug(">>> Crypting private fields...")
     
-    coll = __search(node)
+    search = Visitor(__searchEnter, state=set())
+    walk(node, search)
+    coll = search.state
 
     repl = {}
     for name in coll:
@@ -36,11 +40,13 @@ def optimize(node, contextId=""):
         logging.debug("Replace private field %s with %s (context: %s)", name, repl[name], contextId)
     
     logging.debug("Found %s private fields" % len(repl))
-    modified, reduction = __replace(node, repl)
     
-    logging.debug("Reduced size by %s bytes" % reduction)
+    replace = Visitor(__replaceEnter, state={"repl" : repl, "reduction" : 0})
+    walk(node, replace)
+    
+    logging.debug("Reduced size by %s bytes" % replace.state["reduction"])
     
-    return modified
+    return replace.modified
     
 
 
@@ -51,54 +57,43 @@ def optimize(node, contextId=""):
 __matcher = re.compile("__[a-zA-Z0-9]+")
 
 
-def __search(node, coll=None):
-    
-    if coll is None:
-        coll = set()
-    
-    if node.type == "assign" and node[0].type == "dot":
+def __searchAssign(node, visitor):
+    if node[0].type == "dot":
         # Only last dot child is relevant
         if node[0][1].type == "identifier":
             name = node[0][1].value
             if type(name) is str and __matcher.match(name):
-                coll.add(name)
+                visitor.state.add(name)
         
-    elif node.type == "property_init":
-        name = node[0].value
-        if type(name) is str and __matcher.match(name):
-            coll.add(name)
-
-    for child in node:
-        # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
-        if child != None:
-            __search(child, coll)
-            
-    return coll
+        
+def __searchProperty(node, visitor):
+    name = node[0].value
+    if type(name) is str and __matcher.match(name):
+        visitor.state.add(name)
 
 
 
-def __replace(node, repl):
-    modified = False
-    reduction = 0
-    
-    if node.type == "identifier" and getattr(node, "parent", None):
+def __replaceIdentifier(node, visitor):
+    if getattr(node, "parent", None):
         # Only rename items which are part of a dot operator
         if node.parent.type in ("dot", "property_init") and type(node.value) is str and __matcher.match(node.value):
+            repl = visitor.state["repl"]
             if node.value in repl:
-                reduction = reduction + len(node.value) - len(repl[node.value])
+                visitor.state["reduction"] += len(node.value) - len(repl[node.value])
                 node.value = repl[node.value]
-                modified = True
+                visitor.modified = True
             else:
                 raise Error(node.value, node.line)
-        
-    for child in node:
-        # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
-        if child != None:
-            subModified, subReduction = __replace(child, repl)
-            modified = modified or subModified
-            reduction = reduction + subReduction
-            
-    return modified, reduction
+    
+    
+__searchEnter = {
+    "assign" : __searchAssign,
+    "property_init" : __searchProperty
+}
+
+__replaceEnter = {
+    "identifier" : __replaceIdentifier
+}
     
     
     
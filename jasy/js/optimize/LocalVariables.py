@@ -5,6 +5,7 @@
 
 import string, logging
 from jasy.js.tokenize.Tokenizer import keywords
+from jasy.js.parse.Visitor import Visitor, walk
 
 __all__ = ["optimize", "Error"]
 
@@ -34,7 +35,8 @@ def optimize(node):
     blocked = set(node.scope.shared.keys())
     blocked.update(node.scope.modified)
     
-    __patch(node, blocked)
+    # The state holds the blocked names and the translation tables of the enclosing scopes
+    walk(node, Visitor(__patchEnter, __patchLeave, (blocked, [None])))
 
 
 
@@ -55,122 +57,147 @@ def __baseEncode(num, alphabet=string.ascii_letters):
     return "".join(arr)
 
 
-def __patch(node, blocked=None, enable=False, translate=None):
-    # Start with first level scopes (global scope should not be affected)
-    if node.type == "script" and hasattr(node, "parent"):
-        enable = True
+def __translate(scope, blocked, translate):
+    """ Returns the translation table for the given scope based on the one of the enclosing scope """
     
+    declared = scope.declared
+    params = scope.params
     
-    #
-    # GENERATE TRANSLATION TABLE
-    #
-    if enable:
-        scope = getattr(node, "scope", None)
+    if not declared and not params:
+        return translate
         
-        if scope:
-            declared = scope.declared
-            params = scope.params
-            
-            if declared or params:
-                usedRepl = set()
+    usedRepl = set()
+
+    if not translate:
+        translate = {}
+    else:
+        # copy only the interesting ones from the shared set
+        newTranslate = {}
+
+        for name in scope.shared:
+            if name in translate:
+                newTranslate[name] = translate[name]
+                usedRepl.add(translate[name])
+        translate = newTranslate
+
+    # Merge in usage data into declaration map to have
+    # the possibilities to sort translation priority to
+    # the usage number. Pretty cool.
+
+    names = set()
+    if params:
+        names.update(params)
+    if declared:
+        names.update(declared)
         
-                if not translate:
-                    translate = {}
-                else:
-                    # copy only the interesting ones from the shared set
-                    newTranslate = {}
-            
-                    for name in scope.shared:
-                        if name in translate:
-                            newTranslate[name] = translate[name]
-                            usedRepl.add(translate[name])
-                    translate = newTranslate
-            
-                # Merge in usage data into declaration map to have
-                # the possibilities to sort translation priority to
-                # the usage number. Pretty cool.
+    namesSorted = list(reversed(sorted(names, key=lambda x: scope.accessed[x] if x in scope.accessed else 0)))
+
+    # Extend translation map by new replacements for locally 
+    # declared variables. Automatically ignores keywords. Only
+    # blocks usage of replacements where the original variable from
+    # outer scope is used. This way variable names may be re-used more
+    # often than in the original code.
+    pos = 0
+    for name in namesSorted:
+        while True:
+            repl = __baseEncode(pos)
+            pos += 1
+            if not repl in usedRepl and not repl in keywords and not repl in blocked:
+                break
+    
+        # print("Translate: %s => %s" % (name, repl))
+        translate[name] = repl
         
-                names = set()
-                if params:
-                    names.update(params)
-                if declared:
-                    names.update(declared)
-                
-                namesSorted = list(reversed(sorted(names, key=lambda x: scope.accessed[x] if x in scope.accessed else 0)))
-
-                # Extend translation map by new replacements for locally 
-                # declared variables. Automatically ignores keywords. Only
-                # blocks usage of replacements where the original variable from
-                # outer scope is used. This way variable names may be re-used more
-                # often than in the original code.
-                pos = 0
-                for name in namesSorted:
-                    while True:
-                        repl = __baseEncode(pos)
-                        pos += 1
-                        if not repl in usedRepl and not repl in keywords and not repl in blocked:
-                            break
-                
-                    # print("Translate: %s => %s" % (name, repl))
-                    translate[name] = repl
-
-
-    #
-    # APPLY TRANSLATION
-    #
-    if translate:
+    return translate
+
+
+def __enterScript(node, visitor):
+    blocked, translations = visitor.state
+    translate = translations[-1]
+    
+    # Start with first level scopes (global scope should not be affected)
+    if hasattr(node, "parent"):
+        scope = getattr(node, "scope", None)
+        if scope:
+            translate = __translate(scope, blocked, translate)
+            
         # Update param names in outer function block
-        if node.type == "script" and hasattr(node, "parent"):
+        if translate:
             function = node.parent
             if function.type == "function" and hasattr(function, "params"):
                 for identifier in function.params:
                     if identifier.value in translate:
                         identifier.value = translate[identifier.value]
-            
-        # Update names of exception objects
-        elif node.type == "exception" and node.value in translate:
-            node.value = translate[node.value]
+                        
+    translations.append(translate)
+
+
+def __leaveScript(node, visitor):
+    visitor.state[1].pop()
+
 
-        # Update function name
-        elif node.type == "function" and hasattr(node, "name") and node.name in translate:
-            node.name = translate[node.name]
+def __enterException(node, visitor):
+    translate = visitor.state[1][-1]
     
-        # Update identifiers
-        elif node.type == "identifier":
-            # Ignore param blocks from inner functions
-            if node.parent.type == "list" and getattr(node.parent, "rel", None) == "params":
-                pass
-                
-            # Ignore keyword in property initialization names
-            elif node.parent.type == "property_init" and node.parent[0] == node:
-                pass
-            
-            # Update all identifiers which are 
-            # a) not part of a dot operator
-            # b) first in a dot operator
-            elif node.parent.type != "dot" or node.parent.index(node) == 0:
-                if node.value in translate:
-                    node.value = translate[node.value]
-                
-        # Update declarations (as part of a var statement)
-        elif node.type == "declaration":
-            varName = getattr(node, "name", None)
-            if varName != None:
-                if varName in translate:
-                    node.name = varName = translate[varName]
-            else:
-                # JS 1.7 Destructing Expression
-                for identifier in node.names:
-                    if identifier.value in translate:
-                        identifier.value = translate[identifier.value]
+    # Update names of exception objects
+    if translate and node.value in translate:
+        node.value = translate[node.value]
 
 
-    #
-    # PROCESS CHILDREN
-    #
-    for child in node:
-        # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
-        if child != None:
-            __patch(child, blocked, enable, translate)
+def __enterFunction(node, visitor):
+    translate = visitor.state[1][-1]
+    
+    # Update function name
+    if translate and hasattr(node, "name") and node.name in translate:
+        node.name = translate[node.name]
 
 
+def __enterIdentifier(node, visitor):
+    translate = visitor.state[1][-1]
+    if not translate:
+        return
+    
+    # Ignore param blocks from inner functions
+    if node.parent.type == "list" and getattr(node.parent, "rel", None) == "params":
+        pass
+        
+    # Ignore keyword in property initialization names
+    elif node.parent.type == "property_init" and node.parent[0] == node:
+        pass
+    
+    # Update all identifiers which are 
+    # a) not part of a dot operator
+    # b) first in a dot operator
+    elif node.parent.type != "dot" or node.parent.index(node) == 0:
+        if node.value in translate:
+            node.value = translate[node.value]
+
+
+def __enterDeclaration(node, visitor):
+    translate = visitor.state[1][-1]
+    if not translate:
+        return
+    
+    # Update declarations (as part of a var statement)
+    varName = getattr(node, "name", None)
+    if varName != None:
+        if varName in translate:
+            node.name = varName = translate[varName]
+    else:
+        # JS 1.7 Destructing Expression
+        for identifier in node.names:
+            if identifier.value in translate:
+                identifier.value = translate[identifier.value]
+
+
+__patchEnter = {
+    "script" : __enterScript,
+    "exception" : __enterException,
+    "function" : __enterFunction,
+    "identifier" : __enterIdentifier,
+    "declaration" : __enterDeclaration
+}
+
+__patchLeave = {
+    "script" : __leaveScript
+}
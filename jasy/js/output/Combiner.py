@@ -3,7 +3,7 @@
 # Copyright 2010-2012 Sebastian Werner
 #
 
-import logging, os, random
+import logging, os, random, multiprocessing
 
 from jasy.core.Error import JasyError
 from jasy.core.Permutation import Permutation
@@ -90,7 +90,103 @@ def storeCombined(fileName, classes, bootCode=None):
 
 
 
-def storeCompressed(fileName, classes, bootCode="", permutation=None, translation=None, optimization=None, formatting=None):
+# Classes, caches and parameters of the running compression (inherited by forked workers)
+compression = None
+
+
+def detachCompression():
+    """ Initializer of the forked workers of compressClasses() """
+
+    for cache in compression[1]:
+        cache.detach()
+
+
+def compressWorker(task):
+    """
+    Worker of compressClasses() which runs in a forked process. Compresses the classes with
+    the given indexes re-using the objects of the parent and returns the new cache entries.
+    """
+
+    classes, caches, permutation, translation, optimization, formatting = compression
+    start, end = task
+
+    try:
+        for classObj in classes[start:end]:
+            classObj.getCompressed(permutation, translation, optimization, formatting)
+    except ClassError as error:
+        raise JasyError("Error during class compression! %s" % error)
+
+    return [cache.exportEntries(new=True) for cache in caches]
+
+
+
+def compressClasses(classes, permutation=None, translation=None, optimization=None, formatting=None, processes=None):
+    """
+    Compresses all classes of the given list which are not cached already using a pool of
+    processes (defaults to the number of CPUs). The results are stored in the project caches
+    so that later calls of getCompressed() with the same parameters are cache reads. Does
+    nothing in daemonic processes or without the fork start method of multiprocessing,
+    then the classes are compressed one after another instead.
+    """
+
+    global compression
+
+    work = []
+    caches = []
+    for classObj in classes:
+        project = classObj.getProject()
+        if project is not None and not classObj.hasCompressed(permutation, translation, optimization, formatting):
+            work.append(classObj)
+
+            for cache in (project.getCache(), project.getSharedCache()):
+                if cache is not None and not any(cache is known for known in caches):
+                    caches.append(cache)
+
+    total = len(work)
+    processes = min(processes or multiprocessing.cpu_count(), total)
+    if processes < 2:
+        return
+
+    # Daemonic processes (e.g. the workers of Session.buildMatrix()) are not allowed to have children
+    if multiprocessing.current_process().daemon:
+        logging.debug("Compressing classes in this process as it runs as a daemon")
+        return
+
+    # Forked workers share the classes and the hash seed of this process. This keeps the iteration
+    # order of sets (e.g. during variable optimization) and so the output identical.
+    if not "fork" in multiprocessing.get_all_start_methods():
+        logging.warn("Parallel compression requires the fork start method. Compressing one class after another...")
+        return
+
+    logging.info("Compressing %s classes using %s processes...", total, processes)
+
+    # Multiple small tasks per process balance the differing class sizes
+    size = max(1, total // (processes * 4))
+    tasks = [(pos, pos+size) for pos in range(0, total, size)]
+
+    # Workers read the entries of the parent through the storage
+    for cache in caches:
+        cache.sync()
+
+    compression = (work, caches, permutation, translation, optimization, formatting)
+    pool = multiprocessing.get_context("fork").Pool(processes, initializer=detachCompression)
+
+    try:
+        for entries in pool.imap_unordered(compressWorker, tasks):
+            for cache, cacheEntries in zip(caches, entries):
+                cache.importEntries(cacheEntries)
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+        compression = None
+
+
+
+def storeCompressed(fileName, classes, bootCode="", permutation=None, translation=None, optimization=None, formatting=None, processes=1):
     """
     Combines the compressed result of the stored class list
     
@@ -102,8 +198,12 @@ def storeCompressed(fileName, classes, bootCode="", permutation=None, translatio
     - translation: Translation to apply to the classes before compression (inlining of translation)
     - optimization: Optimization to apply before compression (variable shortening, ...) (See Optimization.py)
     - formatting: Formatting to use during compression (See Formatting.py)
+    - processes: Number of processes compressing classes which are not cached already (None uses all CPUs, ignored in daemonic processes)
     """
     
+    if processes != 1:
+        compressClasses(classes, permutation, translation, optimization, formatting, processes)
+    
     logging.info("Compressing %s classes...", len(classes))
 
     try:
@@ -6,6 +6,7 @@
 import re, sys, json
 from jasy.js.tokenize.Lang import keywords
 from jasy.js.parse.Lang import expressions, futureReserved
+from jasy.js.parse.Visitor import dispatchTable
 
 all = [ "Compressor" ]
 
@@ -73,12 +74,13 @@ class Compressor:
                 result += second
 
         else:
-            try:
-                result = getattr(self, "type_%s" % type)(node)
-            except KeyError:
+            handler = self.handlers.get(type)
+            if handler is None:
                 print("Compressor does not support type '%s' from line %s in file %s" % (type, node.line, node.getFileName()))
                 print(node.toJson())
                 sys.exit(1)
+                
+            result = handler(self, node)
             
         if getattr(node, "parenthesized", None):
             return "(%s)" % result
@@ -554,4 +556,8 @@ class Compressor:
                     result += self.__addSemicolon(temp)
         
         return "%s}" % self.__removeSemicolon(result)
-        
\ No newline at end of file
+
+
+
+# Handlers of all types which are not simple, prefixes or dividers (the type_* methods)
+Compressor.handlers = dispatchTable(Compressor, "type_")
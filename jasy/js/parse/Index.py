@@ -0,0 +1,111 @@
+#
+# Jasy - Web Tooling Framework
+# Copyright 2010-2012 Sebastian Werner
+#
+
+import jasy.js.parse.Node
+
+from jasy.js.util import assembleDot
+
+__all__ = ["Index"]
+
+
+class Index:
+    """
+    Index of the nodes of a tree, typically returned by Node.getIndex(). Offers lists of
+
+    * nodes by type (getType)
+    * dot nodes by assembled name e.g. "core.Env.isSet" (getDots)
+    * call nodes by name of the called function e.g. "core.Class" or "tr" (getCalls)
+
+    All lists are in document order. Every table is built on first use. The call and dot
+    nodes can be given when they were collected while creating the tree (see Serializer),
+    then looking up names does not need to walk the tree.
+    """
+
+    __slots__ = ["changes", "__tree", "__types", "__callNodes", "__dotNodes", "__calls", "__dots", "__order"]
+
+    def __init__(self, tree, calls=None, dots=None):
+        self.changes = jasy.js.parse.Node.changes
+
+        self.__tree = tree
+        self.__types = None
+        self.__callNodes = calls
+        self.__dotNodes = dots
+        self.__calls = None
+        self.__dots = None
+        self.__order = None
+
+
+    def getType(self, nodeType):
+        """ Returns the list of nodes with the given type """
+
+        types = self.__types
+        if types is None:
+            types = self.__types = {}
+
+            stack = [self.__tree]
+            while stack:
+                node = stack.pop()
+                types.setdefault(node.type, []).append(node)
+
+                # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
+                for child in reversed(node):
+                    if child is not None:
+                        stack.append(child)
+
+        return types.get(nodeType, [])
+
+
+    def getDots(self, name):
+        """ Returns the list of dot nodes with the given assembled name """
+
+        dots = self.__dots
+        if dots is None:
+            dots = self.__dots = {}
+
+            nodes = self.__dotNodes
+            if nodes is None:
+                nodes = self.getType("dot")
+
+            for node in nodes:
+                assembled = assembleDot(node)
+                if assembled is not None:
+                    dots.setdefault(assembled, []).append(node)
+
+        return dots.get(name, [])
+
+
+    def getCalls(self, names):
+        """ Returns the list of call nodes which call the given name or one of the given names """
+
+        calls = self.__calls
+        if calls is None:
+            calls = self.__calls = {}
+            order = self.__order = {}
+
+            nodes = self.__callNodes
+            if nodes is None:
+                nodes = self.getType("call")
+
+            for position, node in enumerate(nodes):
+                order[id(node)] = position
+
+                callee = node[0]
+                if callee.type == "identifier":
+                    calls.setdefault(callee.value, []).append(node)
+                elif callee.type == "dot":
+                    assembled = assembleDot(callee)
+                    if assembled is not None:
+                        calls.setdefault(assembled, []).append(node)
+
+        if type(names) is str:
+            return calls.get(names, [])
+
+        result = []
+        for name in names:
+            result.extend(calls.get(name, []))
+
+        order = self.__order
+        result.sort(key=lambda node: order[id(node)])
+        return result
@@ -11,16 +11,82 @@
 #
 
 import json
-import copy
+from operator import indexOf, is_
+from itertools import islice, repeat
+
+__all__ = ["Node", "getAttributes"]
+
+
+# Attributes (nearly) every node has. These are stored in fixed slots.
+slots = ["type", "line", "start", "end", "tokenizer", "parent", "rel", "value"]
+
+# Children which moved further than this are found by renumbering all children
+renumberDistance = 16
+
+# Number of changes to the children of any node. Indexes (see Node.getIndex()) remember
+# the number they were built at and are rebuilt when it changed.
+changes = 0
+
+
+if hasattr(object, "__getstate__"):
+    def getState(node):
+        """
+        Returns the instance dictionary (or None) and a new dictionary with the used slots of
+        the given node. Does not create the instance dictionary of nodes which only use slots.
+        """
+        
+        state = object.__getstate__(node)
+        if type(state) is tuple:
+            # Data to find the position of children is no attribute
+            values = state[1]
+            values.pop("_Node__position", None)
+            values.pop("_Node__shift", None)
+            return state
+            
+        return state, {}
+        
+else:
+    # Python < 3.11
+    def getState(node):
+        values = {}
+        for name in slots:
+            if hasattr(node, name):
+                values[name] = getattr(node, name)
+                
+        return node.__dict__, values
+        
+        
+def getAttributes(node):
+    """ Returns a new dictionary with all attributes of the given node (slots and others) """
+    
+    instance, values = getState(node)
+    if instance:
+        values.update(instance)
+        values.pop("_Node__index", None)
+        
+    return values
+
+
 
 class Node(list):
+    """
+    Node of the syntax tree. Children are the list items, everything else is stored in
+    attributes. The common attributes use slots; rare ones (relations to children, scope
+    data, comments, ...) are stored in the instance dictionary, which is only created when
+    the first of them is set.
+    """
+    
+    __slots__ = slots + ["__position", "__shift", "__dict__"]
+    
+    # File name (not stored per node as it is never set)
+    filename = None
+    
     def __init__(self, tokenizer=None, type=None, args=[]):
         list.__init__(self)
         
         self.start = 0
         self.end = 0
         self.line = None
-        self.filename = None
         
         if tokenizer:
             token = getattr(tokenizer, "token", None)
@@ -68,8 +134,97 @@ class Node(list):
         return count
             
     
+    def indexOf(self, kid):
+        """
+        Returns the position of the given kid (compared by identity) or -1 when it is no child.
+        
+        Every child remembers its last known position in the parent. This is correct unless
+        siblings were inserted or removed in front of it. Loops removing children typically go
+        from front to back, so the shift caused by the previous removals is tried next. Only
+        otherwise the children are searched, starting at the remembered position.
+        """
+        
+        return self.__find(kid)[0]
+        
+        
+    def __find(self, kid):
+        """
+        Returns the position of the given kid (or -1) and the position it remembered before,
+        which is in the same numbering as the remembered positions of its siblings.
+        """
+        
+        try:
+            hint = kid.__position
+        except AttributeError:
+            # None or a child added without the methods of this class (e.g. by the deserializer)
+            return self.__renumber(kid)
+            
+        length = len(self)
+        if hint < length and self[hint] is kid:
+            return hint, hint
+            
+        try:
+            start, delta = self.__shift
+        except AttributeError:
+            pass
+        else:
+            position = hint + delta
+            if hint > start and 0 <= position < length and self[position] is kid:
+                kid.__position = position
+                return position, hint
+            
+        # Removals are more common than insertions, so search backwards first.
+        # Comparing with "is" in map() keeps the loop out of Python.
+        try:
+            position = min(hint, length - 1) - indexOf(map(is_, reversed(self[:hint + 1]), repeat(kid)), True)
+        except ValueError:
+            try:
+                position = hint + 1 + indexOf(map(is_, islice(self, hint + 1, None), repeat(kid)), True)
+            except ValueError:
+                return -1, None
+                
+        # Many positions are outdated when the kid moved that far. Store the correct ones.
+        if abs(position - hint) > renumberDistance:
+            return self.__renumber(kid)
+                
+        kid.__position = position
+        return position, hint
+        
+        
+    def __renumber(self, kid):
+        """Stores the position of all children, returns the position of the given kid twice (or -1)"""
+        
+        result = -1
+        for position, child in enumerate(self):
+            if child is not None:
+                child.__position = position
+            if child is kid:
+                result = position
+                
+        return result, result
+        
+        
+    def index(self, kid, *args):
+        if args:
+            return list.index(self, kid, *args)
+            
+        position = self.indexOf(kid)
+        if position == -1:
+            raise ValueError("Given node is no child!")
+            
+        return position
+        
+        
+    def __contains__(self, kid):
+        return self.indexOf(kid) != -1
+            
+    
     def remove(self, kid):
-        if not kid in self:
+        global changes
+        changes += 1
+        
+        position, hint = self.__find(kid)
+        if position == -1:
             raise Exception("Given node is no child!")
         
         if hasattr(kid, "rel"):
@@ -77,23 +232,39 @@ class Node(list):
             del kid.rel
             del kid.parent
             
-        list.remove(self, kid)
+        del self[position]
+        
+        # Following children remembering a larger position than the kid moved by this difference
+        self.__shift = (hint, position - hint - 1)
         
         
     def insert(self, index, kid):
+        global changes
+        
         if index is None:
             return self.append(kid)
             
+        changes += 1
+        
         if hasattr(kid, "parent"):
             kid.parent.remove(kid)
             
         kid.parent = self
+        
+        # Same position as used by list.insert()
+        length = len(self)
+        if index < 0:
+            index = max(length + index, 0)
+        kid.__position = min(index, length)
 
         return list.insert(self, index, kid)
             
 
     # Always use push to add operands to an expression, to update start and end.
     def append(self, kid, rel=None):
+        global changes
+        changes += 1
+        
         # kid can be null e.g. [1, , 2].
         if kid:
             if hasattr(kid, "parent"):
@@ -118,6 +289,8 @@ class Node(list):
             if rel != None:
                 setattr(self, rel, kid)
                 setattr(kid, "rel", rel)
+                
+            kid.__position = len(self)
 
         # Block None kids when they should be related
         if not kid and rel:
@@ -128,10 +301,16 @@ class Node(list):
     
     # Replaces the given kid with the given replacement kid
     def replace(self, kid, repl):
-        if repl in self:
+        global changes
+        changes += 1
+        
+        # Children always have their parent set, no need to search for other nodes
+        if getattr(repl, "parent", None) is self and self.indexOf(repl) != -1:
             self.remove(repl)
         
-        self[self.index(kid)] = repl
+        position = self.index(kid)
+        self[position] = repl
+        repl.__position = position
         
         if hasattr(kid, "rel"):
             repl.rel = kid.rel
@@ -159,13 +338,14 @@ class Node(list):
 
         relatedChildren = []
         attrsCollection = []
-        for name in dir(self):
+        values = getAttributes(self)
+        for name in sorted(values):
             # "type" is used as node name - no need to repeat it as an attribute
             # "parent" and "target" are relations to other nodes which are not children - for serialization we ignore them at the moment
             # "rel" is used internally to keep the relation to the parent - used by nodes which need to keep track of specific children
             # "start" and "end" are for debugging only
             if name not in ("type", "parent", "comments", "target", "rel", "start", "end") and name[0] != "_":
-                value = getattr(self, name)
+                value = values[name]
                 if isinstance(value, Node):
                     if hasattr(value, "rel"):
                         relatedChildren.append(value)
@@ -234,9 +414,10 @@ class Node(list):
     # Creates a python data structure containing all recursive data of the node
     def export(self):
         attrs = {}
-        for name in dir(self):
+        values = getAttributes(self)
+        for name in sorted(values):
             if name not in ("parent", "target", "rel", "start", "end") and name[0] != "_":
-                value = getattr(self, name)
+                value = values[name]
                 if isinstance(value, Node) and hasattr(value, "rel"):
                     attrs[name] = value.export()
                 elif type(value) in (bool, int, float, str, list):
@@ -251,38 +432,93 @@ class Node(list):
         return attrs    
         
         
-    def __deepcopy__(self, memo):
-        # Create copy
-        if hasattr(self, "tokenizer"):
-            result = Node(self.tokenizer)
-        else:
-            result = Node(None, self.type)
+    def clone(self):
+        """
+        Returns a copy of the node and all its children. Relations of children are restored.
+        Lists, sets and dicts are copied, other values (e.g. tokenizer, scope data, comments)
+        are shared with the original. The "parent" of the node itself and "target" are not
+        copied (the target would point into the original tree).
+        """
         
-        # Copy children
-        for child in self:
-            rel = getattr(child, "rel", None)
-            result.append(copy.deepcopy(child, memo), rel)
-        
-        # Sync attributes
-        for name in dir(self):
-            if not name in ("parent", "target") and name[0] != "_":
-                value = getattr(self, name)
-                if name == "scope" or type(value) in (bool, int, float, str):
+        newNode = Node.__new__
+        appendChild = list.append
+        
+        root = None
+        stack = [(self, None)]
+        pop = stack.pop
+        push = stack.append
+        
+        while stack:
+            node, parent = pop()
+            
+            if node is None:
+                appendChild(parent, None)
+                continue
+                
+            result = newNode(Node)
+            
+            # Slots only contain plain values or shared objects (except "parent")
+            instance, values = getState(node)
+            for name in values:
+                if name != "parent":
+                    setattr(result, name, values[name])
+                    
+            if instance:
+                for name, value in instance.items():
+                    valueType = type(value)
+                    if valueType is Node or name == "target" or name == "_Node__index":
+                        # Relations are restored when appending the children
+                        continue
+                    elif valueType is list or valueType is set or valueType is dict:
+                        value = valueType(value)
+                        
                     setattr(result, name, value)
-                elif name == "scope" or type(value) in (list, set):
-                    setattr(result, name, copy.deepcopy(value, memo))
+                
+            if parent is None:
+                root = result
+            else:
+                result.__position = len(parent)
+                appendChild(parent, result)
+                result.parent = parent
+                rel = values.get("rel")
+                if rel is not None:
+                    setattr(parent, rel, result)
+                    
+            for child in reversed(node):
+                push((child, result))
+                
+        return root
+        
+        
+    def getIndex(self):
+        """
+        Returns the index of the nodes of the tree starting at this node (see Index). It is
+        built on first use and rebuilt when children of any node were added, removed or
+        replaced since then. Changing the type or value of nodes in place is not tracked.
+        """
+        
+        index = getattr(self, "_Node__index", None)
+        if index is None or index.changes != changes:
+            from jasy.js.parse.Index import Index
+            index = self.__index = Index(self)
             
-        # Note: "target" attribute is ignored because if recursion error
-        #       This is used by "break" and "continue" statements only and refers
-        #       to the parent block where the jump should go to. This is not typically
-        #       good style in JS and is not used quite often.
-        # Sync target
-        # if hasattr(self, "target"):
-        #   result.target = copy.deepcopy(self.target, memo)
+        return index
         
-        # Note: "parent" attribute is handled by append() already
-
-        return result
+        
+    def setIndex(self, index):
+        """ Sets the index of the tree starting at this node e.g. when it was collected while creating the tree """
+        
+        self.__index = index
+        
+        
+    def __deepcopy__(self, memo):
+        return self.clone()
+        
+        
+    # Pickles the node (and its children) using the compact tree serialization
+    def __reduce__(self):
+        import jasy.js.parse.Serializer as Serializer
+        return (Serializer.deserialize, (Serializer.serialize(self),))
         
         
     # Converts the node to JSON
@@ -293,7 +529,11 @@ class Node(list):
     # Returns the source code of the node
     def getSource(self):
         if not self.tokenizer:
-            raise Exception("Could not find source for node '%s'" % node.type)
+            raise Exception("Could not find source for node '%s'" % self.type)
+
+        # Deserialized trees do not store their source (see Serializer)
+        if self.tokenizer.source is None:
+            raise Exception("Source of node '%s' is not available in deserialized trees" % self.type)
             
         if getattr(self, "start", None) is not None:
             if getattr(self, "end", None) is not None:
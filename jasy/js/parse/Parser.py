@@ -33,11 +33,16 @@ def parseExpression(source, fileId=None, line=1, builder=None):
 
 
 
-def parse(source, fileId=None, line=1, builder=None):
+def parse(source, fileId=None, line=1, builder=None, comments=True):
+    """
+    Parses the given source and returns the root node. Without comments only doc comments
+    with meta data tags are attached (reduced to these tags) which is all a build requires.
+    """
+    
     if builder == None:
         builder = VanillaBuilder()
     
-    tokenizer = Tokenizer(source, fileId, line)
+    tokenizer = Tokenizer(source, fileId, line, comments)
     staticContext = StaticContext(False, builder)
     node = Script(tokenizer, staticContext)
     
@@ -1149,7 +1154,7 @@ def AssignExpression(tokenizer, staticContext):
 
 def ConditionalExpression(tokenizer, staticContext):
     builder = staticContext.builder
-    node = OrExpression(tokenizer, staticContext)
+    node = BinaryExpression(tokenizer, staticContext)
 
     if tokenizer.match("hook"):
         childNode = node
@@ -1173,149 +1178,75 @@ def ConditionalExpression(tokenizer, staticContext):
     return node
     
 
-def OrExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = AndExpression(tokenizer, staticContext)
-    
-    while tokenizer.match("or"):
-        childNode = builder.OR_build(tokenizer)
-        builder.OR_addOperand(childNode, node)
-        builder.OR_addOperand(childNode, AndExpression(tokenizer, staticContext))
-        builder.OR_finish(childNode)
-        node = childNode
-
-    return node
-
-
-def AndExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = BitwiseOrExpression(tokenizer, staticContext)
-
-    while tokenizer.match("and"):
-        childNode = builder.AND_build(tokenizer)
-        builder.AND_addOperand(childNode, node)
-        builder.AND_addOperand(childNode, BitwiseOrExpression(tokenizer, staticContext))
-        builder.AND_finish(childNode)
-        node = childNode
-
-    return node
-
-
-def BitwiseOrExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = BitwiseXorExpression(tokenizer, staticContext)
-    
-    while tokenizer.match("bitwise_or"):
-        childNode = builder.BITWISEOR_build(tokenizer)
-        builder.BITWISEOR_addOperand(childNode, node)
-        builder.BITWISEOR_addOperand(childNode, BitwiseXorExpression(tokenizer, staticContext))
-        builder.BITWISEOR_finish(childNode)
-        node = childNode
-
-    return node
-
-
-def BitwiseXorExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = BitwiseAndExpression(tokenizer, staticContext)
-    
-    while tokenizer.match("bitwise_xor"):
-        childNode = builder.BITWISEXOR_build(tokenizer)
-        builder.BITWISEXOR_addOperand(childNode, node)
-        builder.BITWISEXOR_addOperand(childNode, BitwiseAndExpression(tokenizer, staticContext))
-        builder.BITWISEXOR_finish(childNode)
-        node = childNode
-
-    return node
-
-
-def BitwiseAndExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = EqualityExpression(tokenizer, staticContext)
-
-    while tokenizer.match("bitwise_and"):
-        childNode = builder.BITWISEAND_build(tokenizer)
-        builder.BITWISEAND_addOperand(childNode, node)
-        builder.BITWISEAND_addOperand(childNode, EqualityExpression(tokenizer, staticContext))
-        builder.BITWISEAND_finish(childNode)
-        node = childNode
-
-    return node
-
-
-def EqualityExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = RelationalExpression(tokenizer, staticContext)
+# Binary operators with their precedence and the builder methods to create their nodes
+binaryOperators = {}
+
+for precedence, names, prefix in (
+    (1, ("or",), "OR"),
+    (2, ("and",), "AND"),
+    (3, ("bitwise_or",), "BITWISEOR"),
+    (4, ("bitwise_xor",), "BITWISEXOR"),
+    (5, ("bitwise_and",), "BITWISEAND"),
+    (6, ("eq", "ne", "strict_eq", "strict_ne"), "EQUALITY"),
+    (7, ("lt", "le", "ge", "gt", "in", "instanceof"), "RELATIONAL"),
+    (8, ("lsh", "rsh", "ursh"), "SHIFT"),
+    (9, ("plus", "minus"), "ADD"),
+    (10, ("mul", "div", "mod"), "MULTIPLY")
+):
+    for name in names:
+        binaryOperators[name] = (precedence, prefix + "_build", prefix + "_addOperand", prefix + "_finish")
+
+
+def BinaryExpression(tokenizer, staticContext):
+    """
+    Parses a chain of binary operators ("or" down to "mul") using operator precedence. All
+    operators are left associative. Creates the same nodes and calls the builder in the same
+    order as a descent through one function per precedence level, but without the nested
+    calls for each operand and without recursion for long chains.
+    """
     
-    while tokenizer.match("eq") or tokenizer.match("ne") or tokenizer.match("strict_eq") or tokenizer.match("strict_ne"):
-        childNode = builder.EQUALITY_build(tokenizer)
-        builder.EQUALITY_addOperand(childNode, node)
-        builder.EQUALITY_addOperand(childNode, RelationalExpression(tokenizer, staticContext))
-        builder.EQUALITY_finish(childNode)
-        node = childNode
-
-    return node
-
-
-def RelationalExpression(tokenizer, staticContext):
     builder = staticContext.builder
     oldLoopInit = staticContext.inForLoopInit
 
-    # Uses of the in operator in shiftExprs are always unambiguous,
+    # Uses of the in operator in operands are always unambiguous,
     # so unset the flag that prohibits recognizing it.
     staticContext.inForLoopInit = False
-    node = ShiftExpression(tokenizer, staticContext)
-
-    while tokenizer.match("lt") or tokenizer.match("le") or tokenizer.match("ge") or tokenizer.match("gt") or (oldLoopInit == False and tokenizer.match("in")) or tokenizer.match("instanceof"):
-        childNode = builder.RELATIONAL_build(tokenizer)
-        builder.RELATIONAL_addOperand(childNode, node)
-        builder.RELATIONAL_addOperand(childNode, ShiftExpression(tokenizer, staticContext))
-        builder.RELATIONAL_finish(childNode)
-        node = childNode
-    
-    staticContext.inForLoopInit = oldLoopInit
-
-    return node
-
-
-def ShiftExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = AddExpression(tokenizer, staticContext)
+    node = UnaryExpression(tokenizer, staticContext)
     
-    while tokenizer.match("lsh") or tokenizer.match("rsh") or tokenizer.match("ursh"):
-        childNode = builder.SHIFT_build(tokenizer)
-        builder.SHIFT_addOperand(childNode, node)
-        builder.SHIFT_addOperand(childNode, AddExpression(tokenizer, staticContext))
-        builder.SHIFT_finish(childNode)
-        node = childNode
-
-    return node
+    # Operators which are waiting for their right operand
+    pending = []
 
+    while True:
+        tokenType = tokenizer.get()
+        operator = binaryOperators.get(tokenType)
+        
+        if operator is None or (tokenType == "in" and oldLoopInit != False):
+            tokenizer.unget()
+            break
+            
+        precedence, build, addOperand, finish = operator
+        
+        # The current operand is the right operand of pending operators with the same or a higher precedence
+        while pending and pending[-1][0] >= precedence:
+            childPrecedence, childNode, childAddOperand, childFinish = pending.pop()
+            childAddOperand(childNode, node)
+            childFinish(childNode)
+            node = childNode
+            
+        childNode = getattr(builder, build)(tokenizer)
+        addOperand = getattr(builder, addOperand)
+        addOperand(childNode, node)
+        pending.append((precedence, childNode, addOperand, getattr(builder, finish)))
+        
+        node = UnaryExpression(tokenizer, staticContext)
 
-def AddExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = MultiplyExpression(tokenizer, staticContext)
-    
-    while tokenizer.match("plus") or tokenizer.match("minus"):
-        childNode = builder.ADD_build(tokenizer)
-        builder.ADD_addOperand(childNode, node)
-        builder.ADD_addOperand(childNode, MultiplyExpression(tokenizer, staticContext))
-        builder.ADD_finish(childNode)
+    while pending:
+        childPrecedence, childNode, childAddOperand, childFinish = pending.pop()
+        childAddOperand(childNode, node)
+        childFinish(childNode)
         node = childNode
-
-    return node
-
-
-def MultiplyExpression(tokenizer, staticContext):
-    builder = staticContext.builder
-    node = UnaryExpression(tokenizer, staticContext)
     
-    while tokenizer.match("mul") or tokenizer.match("div") or tokenizer.match("mod"):
-        childNode = builder.MULTIPLY_build(tokenizer)
-        builder.MULTIPLY_addOperand(childNode, node)
-        builder.MULTIPLY_addOperand(childNode, UnaryExpression(tokenizer, staticContext))
-        builder.MULTIPLY_finish(childNode)
-        node = childNode
+    staticContext.inForLoopInit = oldLoopInit
 
     return node
 
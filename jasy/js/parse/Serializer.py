@@ -0,0 +1,287 @@
+#
+# Jasy - Web Tooling Framework
+# Copyright 2010-2012 Sebastian Werner
+#
+
+import marshal, pickle, array, gc
+
+from jasy.js.parse.Node import Node, getAttributes
+from jasy.js.parse.Index import Index
+from jasy.js.tokenize.Tokenizer import Token
+
+__all__ = ["serialize", "deserialize"]
+
+
+# Increase whenever the format, the table of fixed strings or the pickled values (e.g. comments)
+# change. Part of the cache keys of the tree data, so data of older versions is not read anymore.
+version = 2
+
+# Fixed table of strings (node types, attribute and relation names) which are
+# not stored in the serialized data. Index zero is reserved for empty children.
+fixedStrings = [
+    None,
+
+    # Node types
+    "script", "block", "let_block", "semicolon", "var", "const", "let", "declaration",
+    "function", "getter", "setter", "return", "throw", "try", "catch", "finally",
+    "if", "hook", "switch", "case", "default", "while", "do", "for", "for_in", "with",
+    "break", "continue", "label", "debugger", "yield", "generator", "comp_tail",
+    "array_comp", "array_init", "object_init", "property_init", "list", "comma",
+    "assign", "call", "new", "new_with_args", "dot", "index", "identifier", "number",
+    "string", "regexp", "true", "false", "null", "this", "delete", "void", "typeof",
+    "not", "bitwise_not", "unary_plus", "unary_minus", "increment", "decrement",
+    "and", "or", "bitwise_and", "bitwise_or", "bitwise_xor", "eq", "ne", "strict_eq",
+    "strict_ne", "lt", "le", "gt", "ge", "in", "instanceof", "lsh", "rsh", "ursh",
+    "plus", "minus", "mul", "div", "mod",
+
+    # Attribute names
+    "value", "name", "rel", "filename", "fileId", "functionForm", "assignOp", "postfix",
+    "parenthesized", "readOnly", "isLoop", "isEach", "defaultIndex", "expressionClosure",
+    "start", "end", "labels",
+
+    # Relation names
+    "body", "params", "condition", "thenPart", "elsePart", "expression", "initializer",
+    "setup", "update", "iterator", "object", "discriminant", "statement", "tryBlock",
+    "finallyBlock", "exception", "guard", "tail", "names",
+
+    # Values
+    "declared_form", "expressed_form", "statement_form"
+]
+
+# Types of the nodes which are collected for the index of deserialized trees
+callType = fixedStrings.index("call")
+dotType = fixedStrings.index("dot")
+
+# Attribute which holds the relation of a node to its parent
+relIndex = fixedStrings.index("rel")
+
+# Attributes which are not stored or stored separately
+skippedAttributes = ("type", "line", "parent", "tokenizer", "target")
+
+# Types of attribute values which are stored in the table of constants
+primitiveTypes = (str, int, float, bool, type(None))
+
+
+class DetachedTokenizer:
+    """
+    Replaces the tokenizer of deserialized trees. The source code is not stored,
+    so Node.getSource() raises an error, but nodes created afterwards (e.g. by
+    optimizations) still find the token data they require.
+    """
+
+    def __init__(self, fileId, line, token):
+        self.fileId = fileId
+        self.line = line
+        self.token = token
+        self.source = None
+
+
+
+def serialize(tree, positions=False):
+    """
+    Serializes the given node tree into a compact binary representation.
+
+    Nodes are stored in document order as a flat array of integers: type, number of
+    children, line, attribute count and a flag for the tokenizer reference, followed
+    by pairs of attribute name and value. Names, types and values are indexes into the
+    fixed string table or a table of (interned) constants. Values which are no
+    primitives (comments, scope data) are pickled separately. Start/end positions
+    are only stored when positions is enabled.
+    """
+
+    ints = []
+    constants = []
+    lookup = {}
+    objects = {}
+
+    for index, value in enumerate(fixedStrings):
+        lookup[(str, value)] = index
+
+    def getIndex(value):
+        key = (type(value), value)
+        if key in lookup:
+            return lookup[key]
+
+        index = lookup[key] = len(fixedStrings) + len(constants)
+        constants.append(value)
+        return index
+
+    tokenizer = getattr(tree, "tokenizer", None)
+    stack = [tree]
+    nodeIndex = 0
+
+    while stack:
+        node = stack.pop()
+        if node is None:
+            ints.append(0)
+            nodeIndex += 1
+            continue
+
+        attrs = []
+        extra = None
+        values = getAttributes(node)
+
+        for name, value in values.items():
+            if name in skippedAttributes:
+                continue
+
+            elif not positions and (name == "start" or name == "end"):
+                continue
+
+            elif type(value) in primitiveTypes:
+                attrs.append(getIndex(name))
+                attrs.append(getIndex(value))
+
+            elif not isinstance(value, Node):
+                if extra is None:
+                    extra = objects[nodeIndex] = {}
+                extra[name] = value
+
+        line = values.get("line")
+
+        ints.append(getIndex(node.type))
+        ints.append(len(node))
+        ints.append(0 if line is None else line + 1)
+        ints.append(len(attrs) + (1 if "tokenizer" in values else 0))
+        ints.extend(attrs)
+
+        stack.extend(reversed(node))
+        nodeIndex += 1
+
+    if tokenizer is not None:
+        token = tokenizer.token
+        if token is not None:
+            token = (token.type, token.start, token.end, token.line)
+        tokenizer = (tokenizer.fileId, tokenizer.line, token)
+
+    typecode = "H" if not ints or max(ints) < 65536 else "I"
+
+    return marshal.dumps((version, typecode, array.array(typecode, ints).tobytes(), constants, pickle.dumps(objects, pickle.HIGHEST_PROTOCOL) if objects else None, tokenizer))
+
+
+
+def deserialize(data):
+    """
+    Rebuilds the node tree from data created by serialize(). The call and dot nodes are
+    collected for the index of the tree (see Node.getIndex()).
+    """
+
+    # Creating thousands of linked nodes triggers the cyclic garbage collector again and
+    # again while none of them is garbage. This doubled the time of rebuilding large trees.
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        return __rebuild(data)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def __rebuild(data):
+    """ Implementation of deserialize() """
+
+    storedVersion, typecode, ints, constants, objects, tokenizer = marshal.loads(data)
+    if storedVersion != version:
+        raise ValueError("Unsupported tree data version: %s" % storedVersion)
+
+    values = fixedStrings + constants
+    stream = array.array(typecode)
+    stream.frombytes(ints)
+
+    if objects is not None:
+        objects = pickle.loads(objects)
+
+    if tokenizer is not None:
+        fileId, line, token = tokenizer
+        if token is not None:
+            tokenType, start, end, tokenLine = token
+            token = Token()
+            token.type = tokenType
+            token.start = start
+            token.end = end
+            token.line = tokenLine
+
+        tokenizer = DetachedTokenizer(fileId, line, token)
+
+    newNode = Node.__new__
+    appendChild = list.append
+
+    root = None
+    parent = None
+    remaining = 0
+    parents = []
+    nodeIndex = 0
+    calls = []
+    dots = []
+
+    # Reads the stream without the overhead of the next() builtin
+    stream = iter(stream)
+    nextInt = stream.__next__
+
+    for typeIndex in stream:
+        if typeIndex == 0:
+            node = None
+            length = 0
+
+        else:
+            length = nextInt()
+            line = nextInt()
+            info = nextInt()
+
+            node = newNode(Node)
+            node.type = values[typeIndex]
+            node.line = line - 1 if line else None
+
+            if typeIndex == callType:
+                calls.append(node)
+            elif typeIndex == dotType:
+                dots.append(node)
+
+            if info & 1:
+                node.tokenizer = tokenizer
+
+            count = info >> 1
+            while count:
+                nameIndex = nextInt()
+                value = values[nextInt()]
+
+                # The relation is stored at the node and (as the related child) at the parent
+                if nameIndex == relIndex:
+                    node.rel = value
+                    if parent is not None:
+                        setattr(parent, value, node)
+                else:
+                    setattr(node, values[nameIndex], value)
+
+                count -= 1
+
+            if objects and nodeIndex in objects:
+                for name, value in objects[nodeIndex].items():
+                    setattr(node, name, value)
+
+            if parent is not None:
+                node.parent = parent
+
+        if parent is not None:
+            appendChild(parent, node)
+            remaining -= 1
+
+        else:
+            root = node
+
+        # Continue with the children of the node or return to the first parent with remaining children
+        if length:
+            parents.append((parent, remaining))
+            parent = node
+            remaining = length
+
+        else:
+            while not remaining and parents:
+                parent, remaining = parents.pop()
+
+        nodeIndex += 1
+
+    root.setIndex(Index(root, calls, dots))
+    return root
+
@@ -0,0 +1,136 @@
+#
+# Jasy - Web Tooling Framework
+# Copyright 2010-2012 Sebastian Werner
+#
+
+__all__ = ["Visitor", "walk", "skip", "SKIP", "dispatchTable"]
+
+
+# Returned by handlers for entering a node to not visit its children
+SKIP = "skip"
+
+
+def skip(node, visitor):
+    """ Handler which does not visit the children of the node """
+
+    return SKIP
+
+
+def dispatchTable(cls, prefix):
+    """ Returns a dict which maps node types to the methods of the given class named prefix + type """
+
+    table = {}
+    for name in dir(cls):
+        if name.startswith(prefix):
+            table[name[len(prefix):]] = getattr(cls, name)
+
+    return table
+
+
+
+class Visitor:
+    """
+    One pass over the tree. The handlers are given as tables which map node types to functions.
+    The "enter" handlers are called before the children of a node are visited, the "leave"
+    handlers afterwards. The handler of type "*" is used for all types without a specific
+    handler. Handlers are called with the node and the visitor and store their results in
+    the visitor: modified is set when the pass changed the tree, state holds everything else
+    the pass needs.
+
+    Enter handlers may return SKIP to not visit the children of the node. Children are
+    collected before they are visited, so handlers are allowed to replace or remove the
+    node they are called for.
+    """
+
+    __slots__ = ["enter", "leave", "enterAll", "leaveAll", "state", "modified"]
+
+    def __init__(self, enter=None, leave=None, state=None):
+        self.enter = dict(enter or {})
+        self.leave = dict(leave or {})
+        self.enterAll = self.enter.pop("*", None)
+        self.leaveAll = self.leave.pop("*", None)
+        self.state = state
+        self.modified = False
+
+
+    def hasLeave(self):
+        """ Whether the visitor has handlers for leaving nodes """
+
+        return bool(self.leave) or self.leaveAll is not None
+
+
+
+def walk(tree, *visitors):
+    """
+    Visits all nodes of the given tree in document order. Multiple visitors are processed in one
+    walk, in the given order for every node. This requires that they do not depend on each other
+    besides the results of the nodes visited before. Iterates using an explicit stack, so the
+    depth of the tree is not limited by the recursion limit of Python.
+    """
+
+    if len(visitors) == 1:
+        __walkSingle(tree, visitors[0])
+        return
+
+    stack = [(tree, visitors, False)]
+    while stack:
+        node, active, leaving = stack.pop()
+
+        if leaving:
+            for visitor in active:
+                handler = visitor.leave.get(node.type, visitor.leaveAll)
+                if handler is not None:
+                    handler(node, visitor)
+
+            continue
+
+        descend = active
+        for visitor in active:
+            handler = visitor.enter.get(node.type, visitor.enterAll)
+            if handler is not None and handler(node, visitor) is SKIP:
+                descend = tuple([entry for entry in descend if entry is not visitor])
+
+        leaving = tuple([visitor for visitor in active if visitor.hasLeave()])
+        if leaving:
+            stack.append((node, leaving, True))
+
+        if descend:
+            # None children are allowed sometimes e.g. during array_init like [1,2,,,7,8]
+            for child in reversed(node):
+                if child is not None:
+                    stack.append((child, descend, False))
+
+
+def __walkSingle(tree, visitor):
+    """ Fast path of walk() for a single visitor """
+
+    enter = visitor.enter
+    enterAll = visitor.enterAll
+    leave = visitor.leave
+    leaveAll = visitor.leaveAll
+    hasLeave = visitor.hasLeave()
+
+    stack = [(tree, False)]
+    while stack:
+        node, leaving = stack.pop()
+
+        if leaving:
+            handler = leave.get(node.type, leaveAll)
+            if handler is not None:
+                handler(node, visitor)
+
+            continue
+
+        handler = enter.get(node.type, enterAll)
+        if handler is not None and handler(node, visitor) is SKIP:
+            if hasLeave:
+                stack.append((node, True))
+
+            continue
+
+        if hasLeave:
+            stack.append((node, True))
+
+        for child in reversed(node):
+            if child is not None:
+                stack.append((child, False))
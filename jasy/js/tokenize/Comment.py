@@ -108,6 +108,30 @@ linkMatcher = re.compile(r"\{([a-zA-Z0-9_#\.]+)\}")
 
 
 
+# Tags which are relevant for the meta data of classes (see jasy.js.MetaData)
+metaTags = set(("name", "require", "load", "optional", "break", "asset"))
+
+
+
+def compactMetaComment(text):
+    """
+    Returns the text of a minimal doc comment which only contains the meta data tags of the
+    given doc comment text. Returns None for other comments or when there are no such tags.
+    Used when parsing without comments.
+    """
+    
+    if not text.startswith("/**") or not "#" in text:
+        return None
+        
+    tags = ["#%s%s" % (match.group(1), match.group(2) or "") for match in tagMatcher.finditer(text[3:-2]) if match.group(1) in metaTags]
+    if not tags:
+        return None
+        
+    return "/** %s */" % " ".join(tags)
+
+
+
+
 class CommentException(Exception):
     """
     Thrown when errors during comment processing are detected.
@@ -124,28 +148,22 @@ class Comment():
     Comment class is attached to parsed nodes and used to store all comment related information.
     
     The class supports a new Markdown and TomDoc inspired dialect to make developers life easier and work less repeative.
+    
+    Comments are processed lazily: creating a comment only stores the text. The text is outdented and
+    doc data (tags, params, returns, type) is extracted on first access of one of these fields. The HTML
+    (Markdown conversion and syntax highlighting) is only created when it is requested.
     """
     
     # Relation to code
     context = None
     
-    # Dictionary of tags
-    tags = None
-    
-    # Dictionary of params
-    params = None
-
-    # List of return types
-    returns = None
-    
-    # Static type
-    type = None
-    
-    # Collected text of the comment (without the extracted doc relevant data)
-    text = None
-    
-    # Text of the comment converted to HTML (only for doc comment)
-    html = None
+    # Fields which are filled in by __processText()
+    # - tags: Dictionary of tags
+    # - params: Dictionary of params
+    # - returns: List of return types
+    # - type: Static type
+    # - text: Collected text of the comment (without the extracted doc relevant data)
+    textFields = ("tags", "params", "returns", "type", "text")
     
     
     def __init__(self, text, context=None, lineNo=0, indent="", fileId=None):
@@ -179,6 +197,47 @@ class Comment():
         else:
             raise CommentException("Invalid comment text: %s" % text, lineNo)
 
+        # Everything else is done on demand
+        self.__source = (text, indent, lineNo)
+        self.__doc = None
+        
+    
+    def __getattr__(self, name):
+        """
+        Processes the comment on first access of the text, doc data or HTML. Only called for
+        fields which are not yet processed.
+        """
+        
+        if name == "html":
+            self.__processHtml()
+        elif name in self.textFields:
+            self.__processText()
+        else:
+            raise AttributeError(name)
+            
+        return self.__dict__[name]
+    
+    
+    def getTags(self):
+        return self.tags
+        
+        
+    def __processText(self):
+        """
+        Outdents the comment text and extracts the doc data
+        """
+        
+        if self.__source is None:
+            return
+        
+        text, indent, lineNo = self.__source
+        self.__source = None
+        
+        self.tags = None
+        self.params = None
+        self.returns = None
+        self.type = None
+        
         if "\n" in text:
             # Outdent indention
             text = self.__outdent(text, indent, lineNo)
@@ -190,8 +249,26 @@ class Comment():
 
         # Extract docs
         if self.variant == "doc":
-            text = self.__processDoc(text, lineNo)
-            html = text
+            text = self.__doc = self.__processDoc(text, lineNo)
+            
+            # Post process text to not contain any markup
+            if "<" in text:
+                text = stripMarkup.sub("", text)
+        
+        self.text = text
+        
+        
+    def __processHtml(self):
+        """
+        Converts the text of doc comments to HTML (Markdown and syntax highlighting)
+        """
+        
+        self.__processText()
+        
+        html = None
+        if self.variant == "doc":
+            html = self.__doc
+            self.__doc = None
             
             # Apply markdown convertion
             if html != "":
@@ -202,18 +279,7 @@ class Comment():
                 else:
                     html = code2highlight(html)
         
-            self.html = html
-            
-            # Post process text to not contain any markup
-            if "<" in text:
-                text = stripMarkup.sub("", text)
-        
-        self.text = text
-        
-    
-    
-    def getTags(self):
-        return self.tags
+        self.html = html
         
 
 
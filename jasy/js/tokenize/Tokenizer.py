@@ -13,7 +13,7 @@
 import re, logging
 from copy import copy
 from jasy.js.tokenize.Lang import keywords
-from jasy.js.tokenize.Comment import Comment, CommentException
+from jasy.js.tokenize.Comment import Comment, CommentException, compactMetaComment
 
 __all__ = [ "Tokenizer" ]
 
@@ -74,6 +74,50 @@ assignOperators = ["|", "^", "&", "<<", ">>", ">>>", "+", "-", "*", "/", "%"]
 
 
 
+#
+# Scanner patterns
+#
+
+# Whitespace and comments eaten by skip(). The line variant stops at line breaks
+# and is used while scanning newlines.
+skipPattern = re.compile(r"""
+    (?P<space>[\xA0 \t\n]+)
+  | (?P<block>/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)
+  | (?P<line>//[^\n]*\n?)
+  | (?P<unterminated>/\*)
+""", re.VERBOSE)
+
+skipLinePattern = re.compile(r"""
+    (?P<space>[\xA0 \t]+)
+  | (?P<block>/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)
+  | (?P<line>//[^\n]*\n?)
+  | (?P<unterminated>/\*)
+""", re.VERBOSE)
+
+# Master pattern for all tokens but regular expressions and newlines. The name of the
+# matching group selects the token type. Operators are matched longest first which is
+# identical to extending them char by char as all prefixes are valid operators as well.
+tokenPattern = re.compile(r"""
+    (?P<identifier>[A-Za-z$_][A-Za-z0-9$_]*)
+  | (?P<assign>(?:>>>|<<|>>|[|^&+\-*/%%])=)
+  | (?P<operator>%s)
+  | (?P<string>"[^"\\]*(?:\\[\s\S][^"\\]*)*"|'[^'\\]*(?:\\[\s\S][^'\\]*)*')
+  | (?P<decimal>[1-9][0-9]*(?:\.[0-9]*)?)
+  | (?P<fraction>\.[0-9]+|0\.[0-9]*)
+  | (?P<hex>0[xX][0-9a-fA-F]*)
+  | (?P<octal>0[0-7]+)
+  | (?P<zero>0)
+  | (?P<dot>\.)
+""" % "|".join([re.escape(op) for op in sorted(operatorNames, key=len, reverse=True)]), re.VERBOSE)
+
+# Exponent of decimal numbers (only checked when the number is followed by "e" or "E")
+exponentPattern = re.compile(r"[eE][+-]?[0-9]+")
+
+# Regular expression literals including character classes and flags
+regExpPattern = re.compile(r"/(?:[^\\\[/]|\\[\s\S]|\[(?:[^\\\]]|\\[\s\S])*\])*/[a-z]*")
+
+
+
 
 #
 # Classes
@@ -89,10 +133,11 @@ class ParseError(Exception):
 
 
 class Tokenizer(object):
-    def __init__(self, source, fileId="", line=1):
+    def __init__(self, source, fileId="", line=1, comments=True):
         # source: JavaScript source
         # fileId: Filename (for debugging proposes)
         # line: Line number (for debugging proposes)
+        # comments: Whether to keep comments (otherwise only the meta data tags of doc comments are kept)
         self.cursor = 0
         self.source = str(source)
         self.tokens = {}
@@ -102,6 +147,7 @@ class Tokenizer(object):
         self.fileId = fileId
         self.line = line
         self.comments = []
+        self.keepComments = comments
 
     input_ = property(lambda self: self.source[self.cursor:])
     token = property(lambda self: self.tokens.get(self.tokenIndex))
@@ -160,365 +206,77 @@ class Tokenizer(object):
         startLine = self.line
 
         # Whether this is the first called as happen on start parsing a file (eat leading comments/white space)
-        startOfFile = self.cursor is 0
+        startOfFile = self.cursor == 0
         
         indent = ""
+        match = skipLinePattern.match if self.scanNewlines else skipPattern.match
         
         while (True):
-            if len(input) > self.cursor:
-                ch = input[self.cursor]
-            else:
+            found = match(input, self.cursor)
+            if found is None:
                 return
                 
-            self.cursor += 1
+            kind = found.lastgroup
+            text = found.group()
+            self.cursor = found.end()
             
-            if len(input) > self.cursor:
-                next = input[self.cursor]
-            else:
-                next = None
-
-            if ch == "\n" and not self.scanNewlines:
-                self.line += 1
-                indent = ""
-                
-            elif ch == "/" and next == "*":
-                self.cursor += 1
-                text = "/*"
-                inline = startLine == self.line and startLine > 1
-                commentStartLine = self.line
-                if startLine == self.line and not startOfFile:
-                    mode = "inline"
-                elif (self.line-1) > startLine:
-                    # distance before this comment means it is a comment block for a whole section (multiple lines of code)
-                    mode = "section"
+            if kind == "space":
+                # Indent is the white space since the last line break
+                newlines = text.count("\n")
+                if newlines:
+                    self.line += newlines
+                    indent = text[text.rfind("\n")+1:]
                 else:
-                    # comment for maybe multiple following lines of code, but not that important (no visual white space divider)
-                    mode = "block"
-                    
-                while (True):
-                    try:
-                        ch = input[self.cursor]
-                        self.cursor += 1
-                    except IndexError:
-                        raise ParseError("Unterminated comment", self.fileId, self.line)
-                        
-                    if ch == "*":
-                        next = input[self.cursor]
-                        if next == "/":
-                            text += "*/"
-                            self.cursor += 1
-                            break
-                            
-                    elif ch == "\n":
-                        self.line += 1
-                        
-                    text += ch
+                    indent += text
                     
+                continue
                 
-                # Filter escaping on slash-star combinations in comment text
-                text = text.replace("*\/", "*/")
+            elif kind == "unterminated":
+                raise ParseError("Unterminated comment", self.fileId, self.line)
                 
-                try:
-                    self.comments.append(Comment(text, mode, commentStartLine, indent, self.fileId))
-                except CommentException as commentError:
-                    logging.error("Ignoring comment in %s: %s", self.fileId, commentError)
-                    
-                    
-            elif ch == "/" and next == "/":
-                self.cursor += 1
-                text = "//"
-                if startLine == self.line and not startOfFile:
-                    mode = "inline"
-                elif (self.line-1) > startLine:
-                    # distance before this comment means it is a comment block for a whole section (multiple lines of code)
-                    mode = "section"
-                else:
-                    # comment for maybe multiple following lines of code, but not that important (no visual white space divider)
-                    mode = "block"
-                    
-                while (True):
-                    try:
-                        ch = input[self.cursor]
-                        self.cursor += 1
-                    except IndexError:
-                        # end of file etc.
-                        break
-
-                    if ch == "\n":
-                        self.line += 1
-                        break
-                    
-                    text += ch
-                    
-                try:
-                    self.comments.append(Comment(text, mode, self.line-1, "", self.fileId))
-                except CommentException:
-                    logging.error("Ignoring comment in %s: %s", self.fileId, commentError)
-
-            # check for whitespace, also for special cases like 0xA0
-            elif ch in "\xA0 \t":
-                indent += ch
-
+            if startLine == self.line and not startOfFile:
+                mode = "inline"
+            elif (self.line-1) > startLine:
+                # distance before this comment means it is a comment block for a whole section (multiple lines of code)
+                mode = "section"
             else:
-                self.cursor -= 1
-                return
-
-
-    # Lexes the exponential part of a number, if present. Returns True if an
-    # exponential part was found.
-    def lexExponent(self):
-        input = self.source
-        next = input[self.cursor]
-        if next == "e" or next == "E":
-            self.cursor += 1
-            ch = input[self.cursor]
-            self.cursor += 1
-            if ch == "+" or ch == "-":
-                ch = input[self.cursor]
-                self.cursor += 1
-
-            if ch < "0" or ch > "9":
-                raise ParseError("Missing exponent", self.fileId, self.line)
-
-            while(True):
-                ch = input[self.cursor]
-                self.cursor += 1
-                if not (ch >= "0" and ch <= "9"):
-                    break
-                
-            self.cursor -= 1
-            return True
-
-        return False
-
-
-    def lexZeroNumber(self, ch):
-        token = self.token
-        input = self.source
-        token.type = "number"
-
-        ch = input[self.cursor]
-        self.cursor += 1
-        if ch == ".":
-            while(True):
-                ch = input[self.cursor]
-                self.cursor += 1
-                if not (ch >= "0" and ch <= "9"):
-                    break
+                # comment for maybe multiple following lines of code, but not that important (no visual white space divider)
+                mode = "block"
                 
-            self.cursor -= 1
-            self.lexExponent()
-            token.value = input[token.start:self.cursor]
-            
-        elif ch == "x" or ch == "X":
-            while(True):
-                ch = input[self.cursor]
-                self.cursor += 1
-                if not ((ch >= "0" and ch <= "9") or (ch >= "a" and ch <= "f") or (ch >= "A" and ch <= "F")):
-                    break
-                    
-            self.cursor -= 1
-            token.value = input[token.start:self.cursor]
-
-        elif ch >= "0" and ch <= "7":
-            while(True):
-                ch = input[self.cursor]
-                self.cursor += 1
-                if not (ch >= "0" and ch <= "7"):
-                    break
-                    
-            self.cursor -= 1
-            token.value = input[token.start:self.cursor]
-
-        else:
-            self.cursor -= 1
-            self.lexExponent()     # 0E1, &c.
-            token.value = 0
-    
-
-    def lexNumber(self, ch):
-        token = self.token
-        input = self.source
-        token.type = "number"
-
-        floating = False
-        while(True):
-            ch = input[self.cursor]
-            self.cursor += 1
-            
-            if ch == "." and not floating:
-                floating = True
-                ch = input[self.cursor]
-                self.cursor += 1
+            if kind == "block":
+                commentLine = self.line
+                commentIndent = indent
+                self.line += text.count("\n")
                 
-            if not (ch >= "0" and ch <= "9"):
-                break
-
-        self.cursor -= 1
-
-        exponent = self.lexExponent()
-        segment = input[token.start:self.cursor]
-        
-        # Protect float or exponent numbers
-        if floating or exponent:
-            token.value = segment
-        else:
-            token.value = int(segment)
-
-
-    def lexDot(self, ch):
-        token = self.token
-        input = self.source
-        next = input[self.cursor]
-        
-        if next >= "0" and next <= "9":
-            while (True):
-                ch = input[self.cursor]
-                self.cursor += 1
-                if not (ch >= "0" and ch <= "9"):
-                    break
-
-            self.cursor -= 1
-            self.lexExponent()
-
-            token.type = "number"
-            token.value = input[token.start:self.cursor]
-
-        else:
-            token.type = "dot"
-
-
-    def lexString(self, ch):
-        token = self.token
-        input = self.source
-        token.type = "string"
-
-        hasEscapes = False
-        delim = ch
-        ch = input[self.cursor]
-        self.cursor += 1
-        while ch != delim:
-            if ch == "\\":
-                hasEscapes = True
-                self.cursor += 1
-
-            ch = input[self.cursor]
-            self.cursor += 1
-
-        if hasEscapes:
-            token.value = eval(input[token.start:self.cursor])
-        else:
-            token.value = input[token.start+1:self.cursor-1]
-
-
-    def lexRegExp(self, ch):
-        token = self.token
-        input = self.source
-        token.type = "regexp"
-
-        while (True):
-            try:
-                ch = input[self.cursor]
-                self.cursor += 1
-            except IndexError:
-                raise ParseError("Unterminated regex", self.fileId, self.line)
-
-            if ch == "\\":
-                self.cursor += 1
+                # Filter escaping on slash-star combinations in comment text
+                text = text.replace("*\/", "*/")
                 
-            elif ch == "[":
-                while (True):
-                    if ch == "\\":
-                        self.cursor += 1
-
-                    try:
-                        ch = input[self.cursor]
-                        self.cursor += 1
-                    except IndexError:
-                        raise ParseError("Unterminated character class", self.fileId, self.line)
-                    
-                    if ch == "]":
-                        break
+            else:
+                # Line comments eat their line break (even when scanning newlines)
+                if text.endswith("\n"):
+                    text = text[:-1]
+                    self.line += 1
                     
-            if ch == "/":
-                break
-
-        while(True):
-            ch = input[self.cursor]
-            self.cursor += 1
-            if not (ch >= "a" and ch <= "z"):
-                break
-
-        self.cursor -= 1
-        token.value = input[token.start:self.cursor]
-    
-
-    def lexOp(self, ch):
-        token = self.token
-        input = self.source
-
-        op = ch
-        while(True):
-            try:
-                next = input[self.cursor]
-            except IndexError:
-                break
+                commentLine = self.line - 1
+                commentIndent = ""
                 
-            if (op + next) in operatorNames:
-                self.cursor += 1
-                op += next
-            else:
-                break
-        
-        try:
-            next = input[self.cursor]
-        except IndexError:
-            next = None
-
-        if next == "=" and op in assignOperators:
-            self.cursor += 1
-            token.type = "assign"
-            token.assignOp = operatorNames[op]
-            op += "="
-            
-        else:
-            token.type = operatorNames[op]
-            token.assignOp = None
-
-
-    # FIXME: Unicode escape sequences
-    # FIXME: Unicode identifiers
-    def lexIdent(self, ch):
-        token = self.token
-        input = self.source
-
-        try:
-            while True:
-                ch = input[self.cursor]
-                self.cursor += 1
-            
-                if not ((ch >= "a" and ch <= "z") or (ch >= "A" and ch <= "Z") or (ch >= "0" and ch <= "9") or ch == "$" or ch == "_"):
-                    break
+            if not self.keepComments:
+                text = compactMetaComment(text)
+                if text is None:
+                    continue
                     
-        except IndexError:
-            self.cursor += 1
-            pass
-        
-        # Put the non-word character back.
-        self.cursor -= 1
-
-        identifier = input[token.start:self.cursor]
-        if identifier in keywords:
-            token.type = identifier
-        else:
-            token.type = "identifier"
-            token.value = identifier
+                commentIndent = ""
+                
+            try:
+                self.comments.append(Comment(text, mode, commentLine, commentIndent, self.fileId))
+            except CommentException as commentError:
+                logging.error("Ignoring comment in %s: %s", self.fileId, commentError)
 
 
     def get(self, scanOperand=False):
         """ 
         It consumes input *only* if there is no lookahead.
-        Dispatches to the appropriate lexing function depending on the input.
+        Matches the token at the cursor using precompiled patterns.
         """
         while self.lookahead:
             self.lookahead -= 1
@@ -532,50 +290,95 @@ class Tokenizer(object):
         self.tokenIndex = (self.tokenIndex + 1) & 3
         self.tokens[self.tokenIndex] = token = Token()
 
-        token.start = self.cursor
+        input = self.source
+        start = token.start = self.cursor
         token.line = self.line
 
-        input = self.source
-        if self.cursor == len(input):
-            token.end = token.start
+        if start == len(input):
+            token.end = start
             token.type = "end"
             return token.type
 
-        ch = input[self.cursor]
-        self.cursor += 1
-        
-        if (ch >= "a" and ch <= "z") or (ch >= "A" and ch <= "Z") or ch == "$" or ch == "_":
-            self.lexIdent(ch)
+        ch = input[start]
         
-        elif scanOperand and ch == "/":
-            self.lexRegExp(ch)
+        if scanOperand and ch == "/":
+            match = regExpPattern.match(input, start)
+            if match is None:
+                raise ParseError("Unterminated regex", self.fileId, self.line)
+                
+            end = match.end()
+            token.type = "regexp"
+            token.value = input[start:end]
         
-        elif ch == ".":
-            self.lexDot(ch)
-
         elif self.scanNewlines and ch == "\n":
+            end = start + 1
             token.type = "newline"
             self.line += 1
-
-        elif ch in operatorNames:
-            self.lexOp(ch)
-        
-        elif ch >= "1" and ch <= "9":
-            self.lexNumber(ch)
-        
-        elif ch == "0":
-            self.lexZeroNumber(ch)
-        
-        elif ch == '"' or ch == "'":
-            self.lexString(ch)
-        
+            
         else:
-            raise ParseError("Illegal token: %s (Code: %s)" % (ch, ord(ch)), self.fileId, self.line)
+            match = tokenPattern.match(input, start)
+            if match is None:
+                if ch == '"' or ch == "'":
+                    raise ParseError("Unterminated string", self.fileId, self.line)
+                    
+                raise ParseError("Illegal token: %s (Code: %s)" % (ch, ord(ch)), self.fileId, self.line)
+                
+            kind = match.lastgroup
+            text = match.group()
+            end = match.end()
+            
+            if kind == "identifier":
+                if text in keywords:
+                    token.type = text
+                else:
+                    token.type = "identifier"
+                    token.value = text
+                    
+            elif kind == "operator":
+                token.type = operatorNames[text]
+                token.assignOp = None
+                
+            elif kind == "string":
+                token.type = "string"
+                if "\\" in text:
+                    token.value = eval(text)
+                else:
+                    token.value = text[1:-1]
+                    
+            elif kind == "assign":
+                token.type = "assign"
+                token.assignOp = operatorNames[text[:-1]]
+                
+            elif kind == "dot":
+                token.type = "dot"
+                
+            else:
+                token.type = "number"
+                
+                # Lexes the exponential part of decimal numbers, if present
+                exponent = False
+                if kind != "hex" and kind != "octal" and end < len(input) and input[end] in "eE":
+                    match = exponentPattern.match(input, end)
+                    if match is None:
+                        raise ParseError("Missing exponent", self.fileId, self.line)
+                        
+                    exponent = True
+                    end = match.end()
+                
+                if kind == "zero":
+                    # 0E1, &c.
+                    token.value = 0
+                elif kind == "decimal" and not exponent and not "." in text:
+                    token.value = int(text)
+                else:
+                    # Protect float, exponent, hex and octal numbers
+                    token.value = input[start:end]
 
-        token.end = self.cursor
+        self.cursor = token.end = end
         return token.type
         
 
+
     def unget(self):
         """ Match depends on unget returning undefined."""
         self.lookahead += 1
@@ -281,9 +281,14 @@ def query(node, matcher, deep=True, inner=False):
 def findCall(node, methodName):
     """
     Recurses the tree starting with the given node and returns the first node
-    which calls the given method name (supports namespaces, too)
+    which calls the given method name (supports namespaces, too). Uses the index
+    of the tree when the node is the root of a tree (see Node.getIndex()).
     """
 
+    if getattr(node, "parent", None) is None:
+        calls = node.getIndex().getCalls(methodName)
+        return calls[0] if calls else None
+
     if type(methodName) is str:
         methodName = set([methodName])
     
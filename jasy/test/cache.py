@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+import sys, os, unittest, logging, pkg_resources, tempfile, shutil, dbm, pickle
+
+# Extend PYTHONPATH with local 'lib' folder
+jasyroot = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]), os.pardir, os.pardir, os.pardir))
+sys.path.insert(0, jasyroot)
+
+from jasy.core.Cache import Cache, MemoryStore, SqliteStorage
+
+
+class Tests(unittest.TestCase):
+
+    storage = "dbm"
+    writeBehind = False
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = Cache(self.path, storage=self.storage, writeBehind=self.writeBehind)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.path)
+
+    def reopen(self):
+        self.cache.close()
+        self.cache = Cache(self.path, storage=self.storage, writeBehind=self.writeBehind)
+
+
+    def test_store_read(self):
+        self.cache.store("foo", "bar")
+        self.reopen()
+        self.assertEqual(self.cache.read("foo"), "bar")
+
+    def test_transient(self):
+        self.cache.store("foo", "bar", transient=True)
+        self.assertEqual(self.cache.read("foo"), "bar")
+        self.reopen()
+        self.assertEqual(self.cache.read("foo"), None)
+
+    def test_timestamp_outdated(self):
+        self.cache.store("foo", "bar", 100)
+        self.reopen()
+        self.assertEqual(self.cache.read("foo", 200), None)
+
+    def test_timestamp_valid(self):
+        self.cache.store("foo", "bar", 200)
+        self.reopen()
+        self.assertEqual(self.cache.read("foo", 100), "bar")
+
+    def test_checksum_valid(self):
+        self.cache.store("foo", "bar", 100, checksum="abc")
+        self.reopen()
+        self.assertEqual(self.cache.read("foo", 200, "abc"), "bar")
+
+    def test_checksum_changed(self):
+        self.cache.store("foo", "bar", 200, checksum="abc")
+        self.reopen()
+        self.assertEqual(self.cache.read("foo", 100, "def"), None)
+
+    def test_checksum_fallback(self):
+        self.cache.store("foo", "bar", 200)
+        self.reopen()
+        self.assertEqual(self.cache.read("foo", 100, "abc"), "bar")
+
+    def test_clear(self):
+        self.cache.store("foo", "bar")
+        self.cache.clear()
+        self.assertEqual(self.cache.read("foo"), None)
+        self.reopen()
+        self.assertEqual(self.cache.read("foo"), None)
+
+    def test_limit_heavy(self):
+        self.cache.setLimits(heavy=(2, None))
+        self.cache.store("tree[a]", "a", transient=True)
+        self.cache.store("tree[b]", "b", transient=True)
+        self.cache.store("tree[c]", "c", transient=True)
+        self.assertEqual(self.cache.read("tree[a]"), None)
+        self.assertEqual(self.cache.read("tree[c]"), "c")
+
+    def test_limit_light(self):
+        self.cache.setLimits(light=(1, None))
+        self.cache.store("meta[a]", "a")
+        self.cache.store("meta[b]", "b")
+        self.cache.store("tree[c]", "c", transient=True)
+        self.assertEqual(self.cache.read("tree[c]"), "c")
+
+        # Evicted from memory, but still available from storage
+        self.assertEqual(self.cache.read("meta[a]"), "a")
+        self.assertEqual(self.cache.read("meta[b]"), "b")
+
+    def test_gc_valid(self):
+        self.cache.store("meta[a]", "a")
+        self.cache.store("meta[b]", "b")
+        self.assertEqual(self.cache.collectGarbage(lambda key: key == "meta[a]"), 1)
+        self.reopen()
+        self.assertEqual(self.cache.read("meta[a]"), "a")
+        self.assertEqual(self.cache.read("meta[b]"), None)
+
+    def test_gc_retention(self):
+        self.cache.store("meta[a]", "a", 100)
+        self.cache.store("meta[b]", "b")
+        self.assertEqual(self.cache.collectGarbage(retention=3600), 1)
+        self.reopen()
+        self.assertEqual(self.cache.read("meta[a]"), None)
+        self.assertEqual(self.cache.read("meta[b]"), "b")
+
+    def test_gc_refresh(self):
+        self.cache.store("meta[a]", "a", 100)
+        self.cache.store("meta[b]", "b", 100)
+        self.reopen()
+        self.assertEqual(self.cache.read("meta[a]"), "a")
+        self.reopen()
+        self.assertEqual(self.cache.collectGarbage(retention=3600), 1)
+        self.assertEqual(self.cache.read("meta[a]"), "a")
+        self.assertEqual(self.cache.read("meta[b]"), None)
+
+    def test_statistics(self):
+        self.cache.store("meta[a]", "a")
+        self.cache.read("meta[a]")
+        self.cache.read("meta[b]")
+        self.reopen()
+        self.cache.read("meta[a]")
+
+        counters = self.cache.getStatistics()["meta"]
+        self.assertEqual(counters["transient"], 0)
+        self.assertEqual(counters["disk"], 1)
+        self.assertEqual(counters["miss"], 0)
+        self.assertTrue(counters["bytesRead"] > 0)
+
+        self.cache.read("meta[b]")
+        self.cache.read("meta[a]")
+        counters = self.cache.getStatistics()["meta"]
+        self.assertEqual(counters["transient"], 1)
+        self.assertEqual(counters["miss"], 1)
+
+    def test_compression(self):
+        value = "foo" * 100000
+        self.cache.store("api[a]", value)
+        self.cache.store("api[b]", "bar")
+        self.cache.sync()
+        self.assertTrue(self.cache.getStatistics()["api"]["bytesWritten"] < len(value) / 10)
+        self.reopen()
+        self.assertEqual(self.cache.read("api[a]"), value)
+        self.assertEqual(self.cache.read("api[b]"), "bar")
+
+    def test_import(self):
+        other = Cache(None, storage="memory")
+        other.store("meta[a]", "a", 200, checksum="abc")
+        other.store("meta[b]", "foo" * 100000)
+        self.cache.importEntries(other.exportEntries())
+        self.reopen()
+        self.assertEqual(self.cache.read("meta[a]", 100, "abc"), "a")
+        self.assertEqual(self.cache.read("meta[b]"), "foo" * 100000)
+
+    def test_detach(self):
+        self.cache.store("meta[a]", "a")
+        self.cache.sync()
+        self.cache.detach()
+        self.cache.store("meta[b]", "b")
+        self.assertEqual(self.cache.read("meta[a]"), "a")
+        self.assertEqual([entry[0] for entry in self.cache.exportEntries()], ["meta[b]"])
+
+    def test_detach_new(self):
+        self.cache.detach()
+        self.cache.store("meta[a]", "a")
+        self.assertEqual([entry[0] for entry in self.cache.exportEntries(new=True)], ["meta[a]"])
+        self.cache.store("meta[b]", "b")
+        self.assertEqual([entry[0] for entry in self.cache.exportEntries(new=True)], ["meta[b]"])
+        self.assertEqual(sorted([entry[0] for entry in self.cache.exportEntries()]), ["meta[a]", "meta[b]"])
+
+    def test_compression_mixed(self):
+        value = "foo" * 100000
+        self.cache.close()
+        self.cache = Cache(self.path, storage=self.storage, compression=None)
+        self.cache.store("api[a]", value)
+        self.cache.close()
+
+        self.cache = Cache(self.path, storage=self.storage, compression="lzma")
+        self.cache.store("api[b]", value)
+        self.reopen()
+        self.assertEqual(self.cache.read("api[a]"), value)
+        self.assertEqual(self.cache.read("api[b]"), value)
+
+
+class MemoryTests(unittest.TestCase):
+
+    def test_entries(self):
+        store = MemoryStore(2)
+        store.put("a", 1)
+        store.put("b", 2)
+        store.get("a")
+        store.put("c", 3)
+        self.assertEqual(len(store), 2)
+        self.assertTrue("a" in store)
+        self.assertFalse("b" in store)
+
+    def test_bytes(self):
+        store = MemoryStore(None, 100)
+        store.put("a", 1, 60)
+        store.put("b", 2, 30)
+        store.put("c", 3, 30)
+        self.assertFalse("a" in store)
+        self.assertEqual(store.getBytes(), 60)
+
+    def test_oversized(self):
+        store = MemoryStore(None, 100)
+        store.put("a", 1, 500)
+        self.assertEqual(store.get("a"), 1)
+
+    def test_replace(self):
+        store = MemoryStore(None, 100)
+        store.put("a", 1, 60)
+        store.put("a", 2, 40)
+        self.assertEqual(store.getBytes(), 40)
+        self.assertEqual(store.get("a"), 2)
+
+
+class SqliteTests(Tests):
+
+    storage = "sqlite"
+
+    def test_shared(self):
+        other = Cache(self.path, storage=self.storage)
+        self.cache.store("foo", "bar")
+        self.cache.sync()
+        self.assertEqual(other.read("foo"), "bar")
+        other.store("foo", "baz")
+        other.close()
+        self.reopen()
+        self.assertEqual(self.cache.read("foo"), "baz")
+
+    def test_readonly(self):
+        self.cache.store("foo", "bar")
+        self.cache.sync()
+        reader = SqliteStorage(self.path, readonly=True)
+        self.assertEqual(reader.keys(), ["foo"])
+        reader.close()
+
+        empty = tempfile.mkdtemp()
+        self.assertRaises(IOError, SqliteStorage, empty, readonly=True)
+        self.assertEqual(os.listdir(empty), [])
+        shutil.rmtree(empty)
+
+
+class DbmTests(Tests):
+
+    def test_gc_orphans(self):
+        self.cache.close()
+        db = dbm.open(os.path.join(self.path, "jasycache"), "c")
+        db[b"foo-timestamp"] = pickle.dumps(100)
+        db[b"bar"] = pickle.dumps("bar")
+        db.close()
+
+        self.cache = Cache(self.path)
+        self.cache.collectGarbage()
+        self.cache.close()
+
+        db = dbm.open(os.path.join(self.path, "jasycache"), "r")
+        self.assertEqual(len(db.keys()), 0)
+        db.close()
+        self.cache = Cache(self.path)
+
+
+class WriteBehindTests(Tests):
+
+    writeBehind = True
+
+    def test_pending(self):
+        self.cache.setLimits(light=(1, None))
+        for pos in range(500):
+            self.cache.store("meta[%s]" % pos, pos)
+
+        # Evicted from memory, read from queue or storage
+        self.assertEqual(self.cache.read("meta[1]"), 1)
+        self.cache.flush()
+        self.assertEqual(self.cache.read("meta[2]"), 2)
+
+        self.reopen()
+        self.assertEqual(self.cache.read("meta[499]"), 499)
+
+
+class SqliteWriteBehindTests(WriteBehindTests):
+
+    storage = "sqlite"
+
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    suite = unittest.TestSuite()
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(DbmTests))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(SqliteTests))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(WriteBehindTests))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(SqliteWriteBehindTests))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(MemoryTests))
+    unittest.TextTestRunner(verbosity=2).run(suite)
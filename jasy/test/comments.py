@@ -1160,6 +1160,26 @@ class Tests(unittest.TestCase):
 
 
 
+    def test_lazy(self):
+
+        parsed = self.process('''
+
+        /**
+         * Hello {String} #public #require(foo.Bar)
+         */
+        lazyCommentCmd();
+
+        ''')
+
+        comment = parsed[0].comments[0]
+        self.assertEqual(comment.variant, "doc")
+        self.assertNotIn("tags", comment.__dict__)
+
+        self.assertEqual(comment.getTags(), {"public": True, "require": set(["foo.Bar"])})
+        self.assertEqual(comment.text, "Hello String")
+        self.assertNotIn("html", comment.__dict__)
+
+
 
 if __name__ == '__main__':
     logging.getLogger().setLevel(logging.ERROR)
@@ -240,6 +240,15 @@ class Tests(unittest.TestCase):
     def test_or(self):
         self.assertEqual(self.process('x || y'), 'x||y;')
 
+    def test_precedence(self):
+        self.assertEqual(self.process('a || b && c | d ^ e & f == g < h << i + j * k;'), 'a||b&&c|d^e&f==g<h<<i+j*k;')
+
+    def test_precedence_left(self):
+        self.assertEqual(self.process('a - b - c; a - (b - c); a * b + c * d - e % f;'), 'a-b-c;a-(b-c);a*b+c*d-e%f;')
+
+    def test_precedence_mixed(self):
+        self.assertEqual(self.process('(a || b) && (c + d) * e << 2 > f;'), '(a||b)&&(c+d)*e<<2>f;')
+
     def test_regexp(self):
         self.assertEqual(self.process('var x = /[a-z]/g.exec(foo);'), 'var x=/[a-z]/g.exec(foo);')
 
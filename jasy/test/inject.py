@@ -10,6 +10,7 @@ import jasy.core.Permutation as Permutation
 
 import jasy.js.parse.Parser as Parser
 import jasy.js.parse.ScopeScanner as ScopeScanner
+import jasy.js.parse.Serializer as Serializer
 import jasy.js.output.Compressor as Compressor
 import jasy.js.clean.Permutate as Permutate
 
@@ -169,6 +170,31 @@ class Tests(unittest.TestCase):
             'var prefix="Webkit";'
         )             
 
+    def test_nested(self):
+        self.assertEqual(self.process(
+            '''
+            var x = core.Env.select("engine", {
+              webkit: core.Env.isSet("debug") ? core.Env.getValue("version") : 0,
+              gecko: 1
+            });
+            '''),
+            'var x=false?"3":0;'
+        )
+
+    def test_replacement_copies(self):
+        data = Serializer.serialize(Parser.parse('var x = core.Env.getValue("engine"), y = core.Env.getValue("engine");'))
+        permutation = Permutation.Permutation({'engine': 'webkit'})
+        
+        first = Serializer.deserialize(data)
+        self.assertTrue(Permutate.patch(first, permutation))
+        second = Serializer.deserialize(data)
+        self.assertTrue(Permutate.patch(second, permutation))
+        
+        self.assertIsNot(first[0][0].initializer, first[0][1].initializer)
+        self.assertIsNot(first[0][0].initializer, second[0][0].initializer)
+        self.assertIs(first[0][0].initializer.parent, first[0][0])
+        self.assertEqual(Compressor.Compressor().compress(second), 'var x="webkit",y="webkit";')
+
 
     
 if __name__ == '__main__':
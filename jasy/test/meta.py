@@ -8,6 +8,7 @@ sys.path.insert(0, jasyroot)
 
 import jasy.js.parse.Parser as Parser
 from jasy.js.MetaData import MetaData
+from jasy.js.ClassFacts import ClassFacts
 
         
 class Tests(unittest.TestCase):
@@ -165,6 +166,73 @@ class Tests(unittest.TestCase):
         self.assertEqual(meta.assets, set(["projectx/some/local/url.png"]))        
 
 
+    def test_nocomments(self):
+
+        tree = Parser.parse('''
+
+        /**
+         * Hello World
+         *
+         * #require(my.other.Class) #public #break(my.third.Class)
+         */
+        my.Class = function() {
+
+          // Simple comment
+          var x = 1;
+
+          /**
+           * #asset(projectx/some/local/url.png) #deprecated
+           */
+          var uri = core.io.Asset.toUri("projectx/some/local/url.png");
+
+        };
+
+        ''', comments=False)
+
+        meta = MetaData(tree)
+        self.assertEqual(meta.requires, set(["my.other.Class"]))
+        self.assertEqual(meta.breaks, set(["my.third.Class"]))
+        self.assertEqual(meta.assets, set(["projectx/some/local/url.png"]))
+
+        self.assertEqual(tree[0].comments[0].getTags(), {"require": set(["my.other.Class"]), "break": set(["my.third.Class"])})
+        self.assertFalse(getattr(tree[0].expression[1].body[0], "comments", None))
+
+
+    def test_facts(self):
+
+        tree = Parser.parse('''
+
+        /**
+         * #require(my.other.Class) #name(my.Class)
+         */
+
+        (function() {
+
+          var text = this.tr("Hello");
+
+          if (core.Env.isSet("debug")) {
+            core.Env.select("engine", { webkit: 1, gecko: 2 });
+          }
+
+          window.foo.bar = core.Env.getValue("locale");
+
+        })();
+
+        ''')
+
+        facts = ClassFacts(tree)
+        self.assertEqual(facts.permutationKeys, set(["debug", "engine", "locale"]))
+        self.assertTrue(facts.translation)
+        self.assertEqual(facts.meta.name, "my.Class")
+        self.assertEqual(facts.meta.requires, set(["my.other.Class"]))
+        self.assertIs(facts.scope, tree.scope)
+        self.assertIn("window.foo.bar", facts.scope.packages)
+        
+        facts = ClassFacts(Parser.parse("var x = core.Env; x.isSet('debug');"))
+        self.assertEqual(facts.permutationKeys, set())
+        self.assertFalse(facts.translation)
+
+
 
 if __name__ == '__main__':
     logging.getLogger().setLevel(logging.ERROR)
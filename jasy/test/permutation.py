@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import sys, os, unittest, logging, pkg_resources
+
+# Extend PYTHONPATH with local 'lib' folder
+jasyroot = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]), os.pardir, os.pardir, os.pardir))
+sys.path.insert(0, jasyroot)
+
+from jasy.core.Permutation import Permutation, getPermutation
+
+
+class Tests(unittest.TestCase):
+
+    def test_key(self):
+        permutation = Permutation({"debug": True, "engine": "webkit", "locale": None})
+        self.assertEqual(permutation.getKey(), "debug:true;engine:webkit;locale:null")
+
+    def test_interned(self):
+        self.assertIs(getPermutation({"debug": True, "engine": "webkit"}), getPermutation({"engine": "webkit", "debug": True}))
+
+    def test_equality(self):
+        first = Permutation({"debug": False, "engine": "gecko"})
+        second = Permutation({"engine": "gecko", "debug": False})
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+        self.assertNotEqual(first, Permutation({"debug": True, "engine": "gecko"}))
+        self.assertEqual(len(set([first, second])), 1)
+
+    def test_filter(self):
+        permutation = Permutation({"debug": True, "engine": "webkit", "locale": "de"})
+        filtered = permutation.filter(["engine", "unknown"])
+        self.assertEqual(filtered.getKey(), "engine:webkit")
+        self.assertIs(permutation.filter(frozenset(["engine"])), filtered)
+        self.assertIs(Permutation({"debug": False, "engine": "webkit"}).filter(set(["engine"])), filtered)
+
+    def test_filter_empty(self):
+        permutation = Permutation({"debug": True})
+        self.assertEqual(str(permutation.filter([])), "")
+
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    suite = unittest.TestLoader().loadTestsFromTestCase(Tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
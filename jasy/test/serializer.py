@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import sys, os, unittest, logging, pkg_resources, pickle, copy
+
+# Extend PYTHONPATH with local 'lib' folder
+jasyroot = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]), os.pardir, os.pardir, os.pardir))
+sys.path.insert(0, jasyroot)
+
+import jasy.js.parse.Parser as Parser
+import jasy.js.parse.ScopeScanner as ScopeScanner
+import jasy.js.parse.Serializer as Serializer
+from jasy.js.parse.Node import Node, getAttributes
+import jasy.js.output.Compressor as Compressor
+
+
+class Tests(unittest.TestCase):
+
+    def process(self, code):
+        tree = Parser.parse(code)
+        ScopeScanner.scan(tree)
+        return tree, Serializer.deserialize(Serializer.serialize(tree))
+
+    def compress(self, tree):
+        return Compressor.Compressor().compress(tree)
+
+    def test_roundtrip(self):
+        tree, restored = self.process('function foo(a, b) { if (a) { return [1, , "x", /y/g]; } else { for (var i in b) { b[i]++; } } }')
+        self.assertEqual(self.compress(restored), self.compress(tree))
+
+    def test_relations(self):
+        tree, restored = self.process('if (x) { y(); } else { z(); }')
+        node = restored[0]
+        self.assertEqual(node.type, "if")
+        self.assertIs(node.condition, node[0])
+        self.assertIs(node.thenPart, node[1])
+        self.assertIs(node.elsePart, node[2])
+        self.assertIs(node.thenPart.parent, node)
+        self.assertEqual(node.thenPart.rel, "thenPart")
+
+    def test_sparse(self):
+        tree, restored = self.process('var x = [1, , 3];')
+        array = restored[0][0].initializer
+        self.assertEqual(len(array), 3)
+        self.assertEqual(array[1], None)
+
+    def test_attributes(self):
+        tree, restored = self.process('var x = 1.5, y = "a", z = true;\n\nfoo();')
+        self.assertEqual(restored[0][0].initializer.value, tree[0][0].initializer.value)
+        self.assertEqual(restored[0][1].initializer.value, "a")
+        self.assertEqual(restored[0][2].initializer.type, "true")
+        self.assertEqual(restored[1].line, 3)
+
+    def test_scope(self):
+        tree, restored = self.process('function foo(a) { var b = a; return window.c + b; }')
+        self.assertEqual(restored.scope.shared, tree.scope.shared)
+        self.assertEqual(restored[0].body.scope.declared, tree[0].body.scope.declared)
+
+    def test_positions(self):
+        tree = Parser.parse('var x = 1;')
+        self.assertFalse(hasattr(Serializer.deserialize(Serializer.serialize(tree)), "start"))
+        self.assertEqual(Serializer.deserialize(Serializer.serialize(tree, True))[0].end, tree[0].end)
+
+    def test_source(self):
+        tree = Parser.parse('var x = 1;')
+        self.assertTrue(tree[0].getSource().startswith("var x"))
+
+        for restored in (Serializer.deserialize(Serializer.serialize(tree)), Serializer.deserialize(Serializer.serialize(tree, True)), pickle.loads(pickle.dumps(tree))):
+            self.assertRaisesRegex(Exception, "not available in deserialized trees", restored[0].getSource)
+
+    def test_pickle(self):
+        tree = Parser.parse('var x = foo(1, 2);')
+        restored = pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(self.compress(restored), self.compress(tree))
+        self.assertFalse(hasattr(restored.tokenizer, "source") and restored.tokenizer.source)
+
+    def test_slots(self):
+        tree, restored = self.process('if (x) { y = "z"; }')
+        node = restored[0]
+        self.assertEqual(getAttributes(node.condition), {"type": "identifier", "line": 1, "value": "x", "rel": "condition", "parent": node, "tokenizer": node.tokenizer})
+        self.assertIs(getAttributes(node)["thenPart"], node.thenPart)
+        self.assertFalse(hasattr(node.condition, "start"))
+        self.assertEqual(node.getFileName(), None)
+
+    def test_copy(self):
+        tree, restored = self.process('function foo() { return 1 + 2; }')
+        self.assertEqual(self.compress(copy.deepcopy(restored)), self.compress(tree))
+
+    def test_clone(self):
+        tree = Parser.parse('if (x) { y(1, [2, , 3]); } else { z(); }')
+        ScopeScanner.scan(tree)
+        cloned = tree.clone()
+        self.assertEqual(self.compress(cloned), self.compress(tree))
+        self.assertEqual(cloned.toXml(), tree.toXml())
+
+        node = cloned[0]
+        self.assertIsNot(node, tree[0])
+        self.assertIs(node.thenPart, node[1])
+        self.assertIs(node.thenPart.parent, node)
+        self.assertEqual(node.elsePart.rel, "elsePart")
+        self.assertIs(cloned.scope, tree.scope)
+        self.assertFalse(hasattr(cloned, "parent"))
+
+        node.thenPart[0].expression.remove(node.thenPart[0].expression[1])
+        self.assertEqual(len(tree[0].thenPart[0].expression), 2)
+
+    def test_indexOf(self):
+        tree, restored = self.process('a(); b(); c(); d(); e();')
+        for script in (tree, restored):
+            children = list(script)
+            self.assertEqual(script.indexOf(children[3]), 3)
+            script.remove(children[0])
+            script.remove(children[2])
+            self.assertEqual(script.indexOf(children[4]), 2)
+            self.assertEqual(script.indexOf(children[0]), -1)
+            script.insert(0, Node(None, "semicolon"))
+            self.assertEqual(script.index(children[3]), 2)
+            self.assertTrue(children[4] in script)
+            self.assertFalse(children[0] in script)
+            self.assertEqual(getAttributes(children[3]).get("_Node__position"), None)
+
+    def test_index(self):
+        tree = Parser.parse('core.Class("a.B", {}); x(core.Env.isSet("debug")); core.Env.isSet("x");')
+        index = tree.getIndex()
+        self.assertIs(tree.getIndex(), index)
+        self.assertEqual([node.value for node in index.getType("string")], ["a.B", "debug", "x"])
+        self.assertEqual(len(index.getDots("core.Env.isSet")), 2)
+        self.assertEqual(len(index.getDots("core.Env")), 2)
+        self.assertIs(index.getCalls("core.Class")[0], tree[0].expression)
+        self.assertEqual(index.getCalls(["core.Env.isSet", "x"]), [tree[1].expression, tree[1].expression[1][0], tree[2].expression])
+        self.assertEqual(index.getCalls("y"), [])
+
+        self.assertFalse("_Node__index" in getAttributes(tree))
+        self.assertIsNot(tree.clone().getIndex().getCalls("x")[0], index.getCalls("x")[0])
+
+        tree.remove(tree[2])
+        self.assertIsNot(tree.getIndex(), index)
+        self.assertEqual(len(tree.getIndex().getCalls("core.Env.isSet")), 1)
+
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    suite = unittest.TestLoader().loadTestsFromTestCase(Tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import sys, os, unittest, logging, pkg_resources, tempfile, shutil, json
+
+# Extend PYTHONPATH with local 'lib' folder
+jasyroot = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]), os.pardir, os.pardir, os.pardir))
+sys.path.insert(0, jasyroot)
+
+from jasy.core.Session import Session
+from jasy.core.Project import Project
+from jasy.js.output.Combiner import storeCompressed
+import jasy.js.parse.Serializer as Serializer
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        project = os.path.join(self.path, "project")
+        os.makedirs(os.path.join(project, "source", "class", "app"))
+
+        config = {"name" : "app", "package" : "", "fields" : {"debug" : {"check" : "Boolean", "default" : False}}}
+        with open(os.path.join(project, "jasyproject.json"), "w") as handle:
+            json.dump(config, handle)
+
+        for name in ("Main", "Util", "Other"):
+            with open(os.path.join(project, "source", "class", "app", "%s.js" % name), "w") as handle:
+                handle.write('core.Module("app.%s", { f: function(value) { if (core.Env.isSet("debug")) { return value + 1; } return value; } });' % name)
+
+        self.session = Session()
+        self.session.addProject(Project(project))
+        self.session.permutateField("debug")
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.path)
+
+
+    def test_warmup(self):
+        session = self.session
+        permutations = session.getPermutations()
+        classes = list(session.getProjects()[0].getClasses().values())
+
+        session.warmup(processes=2)
+        for classObj in classes:
+            self.assertTrue(classObj.isWarm(permutations))
+            self.assertEqual(classObj.getPermutationKeys(), set(["debug"]))
+
+    def test_tree_transient(self):
+        project = self.session.getProjects()[0]
+        classObj = project.getClasses()["app.Main"]
+
+        for permutation in self.session.getPermutations():
+            self.assertIs(classObj.getTree(permutation), classObj.getTree(permutation))
+
+        keys = [entry[0] for entry in project.getCache().exportEntries() if entry[0].startswith("tree[")]
+        self.assertEqual(keys, ["tree[%s]-raw%s-False" % (classObj.getId(), Serializer.version)])
+
+    def test_compressed(self):
+        session = self.session
+        permutation = session.getPermutations()[0]
+        classes = list(session.getProjects()[0].getClasses().values())
+
+        def compress(processes):
+            fileName = os.path.join(self.path, "build.js")
+            storeCompressed(fileName, classes, permutation=permutation, processes=processes)
+            with open(fileName) as handle:
+                return handle.read()
+
+        parallel = compress(2)
+        for classObj in classes:
+            self.assertTrue(classObj.hasCompressed(permutation))
+
+        session.clearCache()
+        self.assertEqual(compress(1), parallel)
+
+    def test_matrix_compressed(self):
+        session = self.session
+        classes = list(session.getProjects()[0].getClasses().values())
+
+        def build(permutation, locale):
+            fileName = os.path.join(self.path, "build-%s.js" % permutation.getChecksum())
+            storeCompressed(fileName, classes, permutation=permutation, processes=2)
+
+        result = session.buildMatrix(build, processes=2)
+        self.assertEqual(len(result), 2)
+
+        outputs = [name for name in os.listdir(self.path) if name.startswith("build-")]
+        self.assertEqual(len(outputs), 2)
+
+        for name in outputs:
+            with open(os.path.join(self.path, name)) as handle:
+                self.assertEqual(handle.read().count("core.Module"), 3)
+
+    def test_matrix_warmup(self):
+        session = self.session
+        permutations = session.getPermutations()
+
+        # Only the first permutation is warm inside of the build
+        def build(permutation, locale):
+            session.warmup(processes=2)
+            for classObj in session.getProjects()[0].getClasses().values():
+                self.assertTrue(classObj.isWarm(permutations))
+
+        result = session.buildMatrix(build, permutations=permutations[:1], locales=["de", "en"], processes=2)
+        self.assertEqual(len(result), 2)
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    suite = unittest.TestLoader().loadTestsFromTestCase(Tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import sys, os, unittest, logging, pkg_resources
+
+# Extend PYTHONPATH with local 'lib' folder
+jasyroot = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]), os.pardir, os.pardir, os.pardir))
+sys.path.insert(0, jasyroot)
+
+from jasy.js.tokenize.Tokenizer import Tokenizer, ParseError
+
+
+class Tests(unittest.TestCase):
+
+    def process(self, code, scanOperand=False):
+        tokenizer = Tokenizer(code)
+        result = []
+        while tokenizer.get(scanOperand) != "end":
+            token = tokenizer.token
+            result.append((token.type, getattr(token, "value", None), token.line))
+
+        return result
+
+    def test_identifiers(self):
+        self.assertEqual(self.process("var $foo_1 = this"), [("var", None, 1), ("identifier", "$foo_1", 1), ("assign", None, 1), ("this", None, 1)])
+
+    def test_numbers(self):
+        self.assertEqual([token[1] for token in self.process("12 1.5 1. .5 1e3 0 0x1F 017 0.25E+2")], [12, "1.5", "1.", ".5", "1e3", 0, "0x1F", "017", "0.25E+2"])
+
+    def test_exponent(self):
+        self.assertRaises(ParseError, self.process, "1e+;")
+
+    def test_strings(self):
+        self.assertEqual([token[1] for token in self.process("'a' \"b\\\"c\" 'd\\n'")], ["a", "b\"c", "d\n"])
+
+    def test_unterminated(self):
+        self.assertRaises(ParseError, self.process, "'abc")
+        self.assertRaises(ParseError, self.process, "a /* b")
+
+    def test_operators(self):
+        self.assertEqual([token[0] for token in self.process("a >>>= b >>> c !== d && e <= f")], ["identifier", "assign", "identifier", "ursh", "identifier", "strict_ne", "identifier", "and", "identifier", "le", "identifier"])
+
+    def test_assign(self):
+        tokenizer = Tokenizer("a <<= 2")
+        tokenizer.get()
+        self.assertEqual(tokenizer.get(), "assign")
+        self.assertEqual(tokenizer.token.assignOp, "lsh")
+
+    def test_regexp(self):
+        self.assertEqual(self.process("/a[/\\]]b\\/c/gi", True), [("regexp", "/a[/\\]]b\\/c/gi", 1)])
+        self.assertEqual(self.process("/a/g")[0][0], "div")
+
+    def test_lines(self):
+        self.assertEqual([token[2] for token in self.process("a\n/* b\n c */ d // e\n\n f")], [1, 3, 5])
+
+    def test_newlines(self):
+        tokenizer = Tokenizer("a\nb")
+        tokenizer.get()
+        self.assertEqual(tokenizer.peekOnSameLine(), "newline")
+        self.assertEqual(tokenizer.get(), "identifier")
+        self.assertEqual(tokenizer.token.line, 2)
+
+    def test_illegal(self):
+        self.assertRaises(ParseError, self.process, "a # b")
+
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    suite = unittest.TestLoader().loadTestsFromTestCase(Tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
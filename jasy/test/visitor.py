@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import sys, os, unittest, logging, pkg_resources
+
+# Extend PYTHONPATH with local 'lib' folder
+jasyroot = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]), os.pardir, os.pardir, os.pardir))
+sys.path.insert(0, jasyroot)
+
+import jasy.js.parse.Parser as Parser
+import jasy.js.output.Compressor as Compressor
+import jasy.js.clean.DeadCode as DeadCode
+
+from jasy.js.parse.Visitor import Visitor, walk, skip, SKIP
+
+
+def record(node, visitor):
+    visitor.state.append(node.type)
+
+
+class Tests(unittest.TestCase):
+
+    def test_order(self):
+        visitor = Visitor(enter={"*": record}, leave={"*": lambda node, visitor: visitor.state.append("/" + node.type)}, state=[])
+        walk(Parser.parse("a(b);"), visitor)
+        self.assertEqual(visitor.state, ["script", "semicolon", "call", "identifier", "/identifier", "list", "identifier", "/identifier", "/list", "/call", "/semicolon", "/script"])
+
+    def test_table(self):
+        visitor = Visitor(enter={"identifier": record}, state=[])
+        walk(Parser.parse("x = [1,,y]; z++;"), visitor)
+        self.assertEqual(visitor.state, ["identifier", "identifier", "identifier"])
+
+    def test_skip(self):
+        first = Visitor(enter={"function": skip, "identifier": record}, state=[])
+        second = Visitor(enter={"identifier": record}, state=[])
+        walk(Parser.parse("a; function b() { c; }"), first, second)
+        self.assertEqual(len(first.state), 1)
+        self.assertEqual(len(second.state), 2)
+        self.assertIs(skip(None, None), SKIP)
+
+    def test_deep(self):
+        visitor = Visitor(enter={"number": record}, state=[])
+        walk(Parser.parse("x = " + "1+" * 3000 + "1;"), visitor)
+        self.assertEqual(len(visitor.state), 3001)
+
+    def test_combined(self):
+        tree = Parser.parse('if (true) { a(); } else { b(); }')
+        calls = Visitor(leave={"call": record}, state=[])
+        deadCode = DeadCode.visitor()
+        walk(tree, calls, deadCode)
+        self.assertEqual(calls.state, ["call", "call"])
+        self.assertTrue(deadCode.modified)
+        self.assertEqual(Compressor.Compressor().compress(tree), "{a()}")
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.ERROR)
+    suite = unittest.TestLoader().loadTestsFromTestCase(Tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)